@@ -1,15 +1,18 @@
 # chatbot.py
 
 import os
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
-from langchain_community.vectorstores import Qdrant
-from langchain_ollama import ChatOllama
-from langchain_community.chat_models import ChatOpenAI
-from qdrant_client import QdrantClient
+import sys
 from langchain import PromptTemplate
 from langchain.chains import RetrievalQA
-import streamlit as st
-from streamlit_callback_handler import StreamlitCallbackHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from query_cache import LRUQueryEmbeddings
+from query_batcher import BatchedQueryEmbeddings
+from hybrid import HybridQdrantRetriever, is_hybrid_collection
+from resources import (
+    get_resource, get_bge_embeddings, get_sparse_query_embeddings, get_qdrant_client, get_response_cache,
+    get_chat_ollama, get_chat_openai
+)
 
 class ChatbotManager:
     def __init__(   
@@ -38,13 +41,18 @@ class ChatbotManager:
         self.qdrant_url = qdrant_url
         self.collection_name = collection_name
 
-        # Initialize Embeddings
-        self.embeddings = HuggingFaceBgeEmbeddings(
-            model_name=self.model_name,
-            model_kwargs={"device": self.device},
-            encode_kwargs=self.encode_kwargs,
+        # Initialize Embeddings from the shared registry: recent query embeddings are kept in memory
+        # and concurrent retriever queries are coalesced into one batched encode
+        self.embeddings = get_resource(
+            ("retriever_embeddings", self.model_name, self.device, tuple(sorted(self.encode_kwargs.items()))),
+            lambda: LRUQueryEmbeddings(BatchedQueryEmbeddings(
+                get_bge_embeddings(self.model_name, self.device, self.encode_kwargs)
+            ))
         )
 
+        # Cache of answers to repeated questions at temperature 0, shared by all sessions
+        self.response_cache = get_response_cache()
+
         # Initialize LLM based on choice
         self.initialize_llm()
 
@@ -60,16 +68,7 @@ Helpful answer:
 """
 
         # Initialize Qdrant client
-        self.client = QdrantClient(
-            url=self.qdrant_url, prefer_grpc=False
-        )
-
-        # Initialize the Qdrant vector store
-        self.db = Qdrant(
-            client=self.client,
-            embeddings=self.embeddings,
-            collection_name=self.collection_name
-        )
+        self.client = get_qdrant_client(self.qdrant_url)
 
         # Initialize the prompt
         self.prompt = PromptTemplate(
@@ -78,7 +77,7 @@ Helpful answer:
         )
 
         # Initialize the retriever
-        self.retriever = self.db.as_retriever(search_kwargs={"k": 10})
+        self.initialize_retriever()
 
         # Define chain type kwargs
         self.chain_type_kwargs = {"prompt": self.prompt}
@@ -86,23 +85,56 @@ Helpful answer:
         # Initialize the RetrievalQA chain
         self.initialize_qa_chain()
 
-    def initialize_llm(self):
-        streamlit_container = st.empty()
-        callback_handler = StreamlitCallbackHandler(container=streamlit_container)
+    def initialize_retriever(self):
+        # Hybrid collections get a single fused dense + sparse query, whose exact-term matches let
+        # a smaller k carry the same answers. Questions are not routed here: they are usually about
+        # the uploaded documents, which carry no tags
+        self.hybrid = is_hybrid_collection(self.client, self.collection_name)
+        if self.hybrid:
+            self.retriever = HybridQdrantRetriever(
+                client=self.client,
+                collection_name=self.collection_name,
+                embeddings=self.embeddings,
+                sparse_query_embeddings=get_sparse_query_embeddings(self.model_name, self.device),
+                k=5,
+            )
+        else:
+            # Initialize the Qdrant vector store
+            from langchain_community.vectorstores import Qdrant
+            self.db = Qdrant(
+                client=self.client,
+                embeddings=self.embeddings,
+                collection_name=self.collection_name
+            )
+            self.retriever = self.db.as_retriever(search_kwargs={"k": 10})
+
+    def refresh_retriever(self):
+        """Switch retrievers when the collection's layout changed since they were built.
+
+        On a fresh install the collection only appears with the first upload,
+        as a hybrid (named-vector) collection, after this manager was created.
+        """
+        if is_hybrid_collection(self.client, self.collection_name) != self.hybrid:
+            self.initialize_retriever()
+            self.initialize_qa_chain()
 
+    def initialize_llm(self):
+        # Streaming output is handled per request (stream_response or get_response callbacks),
+        # so the LLM carries no UI callbacks and one long-lived client per configuration is shared
+        # from the registry, keeping its HTTP connections (and the Ollama model) warm
         if self.llm_choice == "ollama":
-            self.llm = ChatOllama(
+            self.llm = get_chat_ollama(
                 model=self.llm_model,
                 temperature=self.llm_temperature,
                 streaming=True,
-                callbacks=[callback_handler],
+                keep_alive="30m",
             )
         elif self.llm_choice == "openai":
-            self.llm = ChatOpenAI(
+            self.llm = get_chat_openai(
                 model=self.openai_model,
                 temperature=self.openai_temperature,
                 api_key=self.openai_api_key,
-                callbacks=[callback_handler],
+                streaming=True,
             )
         else:
             raise ValueError(f"Unsupported LLM choice: {self.llm_choice}")
@@ -117,16 +149,82 @@ Helpful answer:
             verbose=False
         )
 
-    def get_response(self, query: str) -> str:
+    def response_cache_key(self, query: str):
+        if self.llm_choice == "ollama":
+            model, temperature = self.llm_model, self.llm_temperature
+        else:
+            model, temperature = self.openai_model, self.openai_temperature
+        return self.response_cache.key(
+            query, self.collection_name, self.prompt_template, f"{self.llm_choice}:{model}", temperature
+        )
+
+    def get_response(self, query: str, callbacks: list = None) -> str:
             try:
-                response = self.qa(query)
+                cache_key = self.response_cache_key(query)
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+                self.refresh_retriever()
+                response = self.qa(query, callbacks=callbacks)
                 answer = response['result']
+                self.response_cache.put(cache_key, answer)
                 return answer  # Return only the answer, without the "Answer:" prefix
             except Exception as e:
                 return f"⚠️ An error occurred while processing your request: {e}"
 
+    def build_prompt(self, query: str, docs) -> str:
+        # Same layout as the "stuff" chain: document contents separated by blank lines
+        context = "\n\n".join(doc.page_content for doc in docs)
+        return self.prompt.format(context=context, question=query)
+
+    def stream_response(self, query: str):
+        """Yield the answer to `query` token by token as the LLM produces it."""
+        try:
+            cache_key = self.response_cache_key(query)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+            self.refresh_retriever()
+            docs = self.retriever.invoke(query)
+            tokens = []
+            for chunk in self.llm.stream(self.build_prompt(query, docs)):
+                tokens.append(chunk.content)
+                yield chunk.content
+            self.response_cache.put(cache_key, "".join(tokens))
+        except Exception as e:
+            yield f"⚠️ An error occurred while processing your request: {e}"
+
+    async def astream_response(self, query: str):
+        """Async variant of stream_response."""
+        try:
+            cache_key = self.response_cache_key(query)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+            self.refresh_retriever()
+            docs = await self.retriever.ainvoke(query)
+            tokens = []
+            async for chunk in self.llm.astream(self.build_prompt(query, docs)):
+                tokens.append(chunk.content)
+                yield chunk.content
+            self.response_cache.put(cache_key, "".join(tokens))
+        except Exception as e:
+            yield f"⚠️ An error occurred while processing your request: {e}"
+
+
+    def llm_settings(self):
+        return (
+            self.llm_choice, self.llm_model, self.llm_temperature,
+            self.openai_model, self.openai_temperature, self.openai_api_key,
+        )
 
     def update_llm(self, llm_choice: str, **kwargs):
+        previous_settings = self.llm_settings()
         self.llm_choice = llm_choice
         if llm_choice == "ollama":
             self.llm_model = kwargs.get("model", self.llm_model)
@@ -135,6 +233,10 @@ Helpful answer:
             self.openai_model = kwargs.get("model", self.openai_model)
             self.openai_temperature = kwargs.get("temperature", self.openai_temperature)
             self.openai_api_key = kwargs.get("api_key", self.openai_api_key)
-        
+
+        # Nothing changed: keep the current LLM client and RetrievalQA chain
+        if self.llm_settings() == previous_settings:
+            return
+
         self.initialize_llm()
         self.initialize_qa_chain()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class IngestionJob:
+    def __init__(self, file_name: str, file_path: str):
+        self.id = str(uuid.uuid4())
+        self.file_name = file_name
+        self.file_path = file_path
+        self.status = "queued"
+        self.stage = "queued"
+        self.loaded = 0
+        self.load_total = None
+        self.embedded = 0
+        self.upserted = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def fraction(self) -> float:
+        if self.status == "done":
+            return 1.0
+        # Chunks stream through the stages, so only parsing has a known total;
+        # embedding and upserting trail it closely
+        if not self.load_total:
+            return 0.0
+        return 0.95 * self.loaded / self.load_total
+
+    def update(self, stage: str, done: int, total: int = None):
+        self.stage = stage
+        if stage == "loading":
+            self.loaded = done
+            self.load_total = total or self.load_total
+        elif stage == "embedding":
+            self.embedded = done
+        elif stage == "upserting":
+            self.upserted = done
+
+
+class IngestionJobManager:
+    """Run EmbeddingsManager.create_embeddings for uploaded files in the background.
+
+    Each job works on its own copy of the upload, so the page can keep
+    accepting files and answering questions against the existing
+    collection while documents are indexed.
+    """
+
+    def __init__(self, embeddings_manager, max_jobs: int = 2):
+        self.embeddings_manager = embeddings_manager
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ingestion")
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self.work_dir = tempfile.mkdtemp(prefix="ingestion_jobs_")
+
+    def submit(self, file_path: str, file_name: str = None) -> IngestionJob:
+        _, file_extension = os.path.splitext(file_path)
+        job_path = os.path.join(self.work_dir, f"{uuid.uuid4()}{file_extension}")
+        shutil.copyfile(file_path, job_path)
+
+        job = IngestionJob(file_name or os.path.basename(file_path), job_path)
+        with self._lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: IngestionJob):
+        job.status = "running"
+        try:
+            job.result = self.embeddings_manager.create_embeddings(
+                job.file_path, progress=job.update, source=job.file_name
+            )
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+    def get(self, job_id: str) -> IngestionJob:
+        return self.jobs.get(job_id)
+
+    def active_jobs(self):
+        return [job for job in self.jobs.values() if not job.done]
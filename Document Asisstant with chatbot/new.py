@@ -4,11 +4,24 @@ from streamlit import session_state
 import time
 import base64
 import os
-import pandas as pd
-from vectors import EmbeddingsManager
-from chatbot import ChatbotManager
+import sys
+import importlib
+from ingestion_jobs import IngestionJobManager
 import json 
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resources import get_resource, get_bge_embeddings, get_qdrant_client
+from stream_renderer import render_stream
+from startup import start_warmup
+
+# LangChain, the Unstructured loaders and BGE-M3 load on a background thread while the page renders;
+# chatbot/vectors are imported on first use, so the Home page does not wait for them
+start_warmup({
+    "chatbot and vectors modules": lambda: (importlib.import_module("chatbot"), importlib.import_module("vectors")),
+    "BGE-M3 encoder": lambda: get_bge_embeddings("BAAI/bge-m3", "cpu", {"normalize_embeddings": True}),
+    "Qdrant client": lambda: get_qdrant_client("http://localhost:6333"),
+}, name="document_assistant")
+
 # Function to display PDF
 def displayPDF(file):
     base64_pdf = base64.b64encode(file.read()).decode('utf-8')
@@ -22,6 +35,7 @@ def displayMarkdown(file):
 
 # Function to display CSV
 def displayCSV(file):
+    import pandas as pd
     df = pd.read_csv(file)
     st.dataframe(df)
 
@@ -32,6 +46,7 @@ def displayJSON(file):
 
 # Function to display Excel
 def displayExcel(file):
+    import pandas as pd
     df = pd.read_excel(file)
     st.dataframe(df)
 
@@ -44,6 +59,10 @@ if 'messages' not in st.session_state:
     st.session_state['messages'] = []
 if 'llm_choice' not in st.session_state:
     st.session_state['llm_choice'] = 'ollama'
+if 'ingestion_job_id' not in st.session_state:
+    st.session_state['ingestion_job_id'] = None
+if 'submitted_upload' not in st.session_state:
+    st.session_state['submitted_upload'] = None
 
 # Function to get OpenAI API key
 def get_openai_api_key():
@@ -53,6 +72,7 @@ def get_openai_api_key():
     return api_key
 
 def initialize_chatbot_manager():
+    from chatbot import ChatbotManager
     openai_api_key = get_openai_api_key()
     
     if st.session_state['chatbot_manager'] is None or st.session_state['llm_choice'] != st.session_state['chatbot_manager'].llm_choice:
@@ -72,6 +92,22 @@ def initialize_chatbot_manager():
     elif st.session_state['llm_choice'] == 'openai' and openai_api_key:
         st.session_state['chatbot_manager'].update_llm('openai', api_key=openai_api_key)
 
+# Progress of the background ingestion job, refreshed on its own without rerunning the page
+@st.fragment(run_every=1.0)
+def show_ingestion_progress(ingestion_jobs, job_id):
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        return
+    if job.status == "failed":
+        st.error(f"An error occurred: {job.error}")
+    elif job.status == "done":
+        st.success(job.result)
+    else:
+        st.progress(
+            job.fraction,
+            text=f"🔄 {job.file_name}: {job.stage} ({job.embedded} chunks embedded, {job.upserted} stored)"
+        )
+
 # Set the page configuration
 st.set_page_config(
     page_title="Document Buddy App",
@@ -152,6 +188,7 @@ elif choice == "🤖 Chatbot":
                 f.write(uploaded_file.getbuffer())
             
             st.session_state['temp_file_path'] = temp_file_path
+            st.session_state['temp_file_name'] = uploaded_file.name
 
     # Column 2: Create Embeddings
     with col2:
@@ -162,19 +199,27 @@ elif choice == "🤖 Chatbot":
                 st.warning("⚠️ No file uploaded. Using existing vector database.")
             else:
                 try:
-                    embeddings_manager = EmbeddingsManager(
-                        model_name="BAAI/bge-m3",
-                        device="cpu",
-                        encode_kwargs={"normalize_embeddings": True},
-                        qdrant_url="http://localhost:6333",
-                        collection_name="Rishabh_Collection"
+                    from vectors import EmbeddingsManager
+                    ingestion_jobs = get_resource(
+                        ("ingestion_jobs", "Rishabh_Collection"),
+                        lambda: IngestionJobManager(EmbeddingsManager(
+                            model_name="BAAI/bge-m3",
+                            device="cpu",
+                            encode_kwargs={"normalize_embeddings": True},
+                            qdrant_url="http://localhost:6333",
+                            collection_name="Rishabh_Collection"
+                        ))
                     )
-                    
-                    with st.spinner("🔄 Embeddings are in process..."):
-                        result = embeddings_manager.create_embeddings(st.session_state['temp_file_path'])
-                        time.sleep(1)
-                    st.success(result)
-                    
+
+                    # Index each upload once in the background; reruns only show its progress
+                    upload = (st.session_state['temp_file_name'], uploaded_file.size if uploaded_file else None)
+                    if st.session_state['submitted_upload'] != upload:
+                        job = ingestion_jobs.submit(st.session_state['temp_file_path'], st.session_state['temp_file_name'])
+                        st.session_state['ingestion_job_id'] = job.id
+                        st.session_state['submitted_upload'] = upload
+
+                    show_ingestion_progress(ingestion_jobs, st.session_state['ingestion_job_id'])
+
                 except Exception as e:
                     st.error(f"An error occurred: {e}")
 
@@ -195,19 +240,15 @@ elif choice == "🤖 Chatbot":
             st.session_state['messages'].append({"role": "user", "content": user_input})
 
             try:
-                st.session_state['chatbot_manager'].initialize_llm()  # Reset callback handler
-                
-                # Create a placeholder for the assistant's response
-                assistant_response = st.empty()
-                
-                # Get the streamed response
-                answer = st.session_state['chatbot_manager'].get_response(user_input)
+                # Render the answer in place as the tokens arrive
+                with st.chat_message("assistant"):
+                    assistant_response = st.empty()
+                    answer, _ = render_stream(
+                        assistant_response, st.session_state['chatbot_manager'].stream_response(user_input)
+                    )
                 
-                # Add the response to the session state
+                # Add the response to the session state; it is already on screen, so no rerun is needed
                 st.session_state['messages'].append({"role": "assistant", "content": answer})
-                
-                # Force a rerun to update the chat history
-                st.rerun()
             except Exception as e:
                 st.error(f"⚠️ An error occurred while processing your request: {e}")
 
@@ -1,24 +1,71 @@
 import os
+import sys
 import json
-from typing import List
-from langchain_community.document_loaders import (
-    UnstructuredPDFLoader,
-    UnstructuredMarkdownLoader,
-    UnstructuredPowerPointLoader,
-    CSVLoader,
-    UnstructuredExcelLoader
-)
+import shutil
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Iterator, List
 from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
     MarkdownTextSplitter,
     PythonCodeTextSplitter
 )
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
-from langchain_community.vectorstores import Qdrant
 from langchain.schema import Document
-from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingestion import (
+    iter_pages, upsert_pages, point_id, file_hash, bump_collection_version, existing_point_ids, DocumentRegistry
+)
+from hybrid import is_hybrid_collection, point_vector
+from collection_setup import ensure_collection
+from resources import get_bge_embeddings, get_sparse_encoder, get_qdrant_client
+
+def get_loader(file_path: str, file_extension: str):
+    # The Unstructured loaders pull in heavy parsing libraries, so they are imported on first use
+    from langchain_community.document_loaders import (
+        UnstructuredPDFLoader,
+        UnstructuredMarkdownLoader,
+        UnstructuredPowerPointLoader,
+        CSVLoader,
+        UnstructuredExcelLoader
+    )
+    if file_extension == '.pdf':
+        return UnstructuredPDFLoader(file_path)
+    elif file_extension == '.md':
+        return UnstructuredMarkdownLoader(file_path)
+    elif file_extension in ['.ppt', '.pptx']:
+        return UnstructuredPowerPointLoader(file_path)
+    elif file_extension == '.csv':
+        return CSVLoader(file_path)
+    elif file_extension in ['.xls', '.xlsx']:
+        return UnstructuredExcelLoader(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+def load_pdf_shard(shard_path: str, source: str, first_page: int, last_page: int) -> List[Document]:
+    # Runs in a worker process: parse one page range and point the metadata back at the original file
+    docs = get_loader(shard_path, '.pdf').load()
+    for doc in docs:
+        doc.metadata.update({"source": source, "first_page": first_page, "last_page": last_page})
+    return docs
+
+def shard_pdf(file_path: str, pages_per_shard: int, output_dir: str):
+    """Yield (shard_path, first_page, last_page) for page-range copies of a PDF."""
+    from pypdf import PdfReader, PdfWriter
+    reader = PdfReader(file_path)
+    for start in range(0, len(reader.pages), pages_per_shard):
+        writer = PdfWriter()
+        for page in reader.pages[start:start + pages_per_shard]:
+            writer.add_page(page)
+        shard_path = os.path.join(output_dir, f"pages_{start + 1}.pdf")
+        with open(shard_path, "wb") as f:
+            writer.write(f)
+        yield shard_path, start + 1, min(start + pages_per_shard, len(reader.pages))
+
 class EmbeddingsManager:
     def __init__(
         self,
@@ -27,6 +74,7 @@ class EmbeddingsManager:
         encode_kwargs: dict = {"normalize_embeddings": True},
         qdrant_url: str = "http://localhost:6333",
         collection_name: str = "Rishabh_Collection",
+        registry_path: str = "document_registry.json",
     ):
         self.model_name = model_name
         self.device = device
@@ -34,35 +82,67 @@ class EmbeddingsManager:
         self.qdrant_url = qdrant_url
         self.collection_name = collection_name
 
-        self.embeddings = HuggingFaceBgeEmbeddings(
-            model_name=self.model_name,
-            model_kwargs={"device": self.device},
-            encode_kwargs=self.encode_kwargs,
-        )
+        # Embeddings and client are shared with ChatbotManager through the registry
+        self.embeddings = get_bge_embeddings(self.model_name, self.device, self.encode_kwargs)
+
+        self.client = get_qdrant_client(self.qdrant_url, timeout=10)
 
-        self.client = QdrantClient(url=self.qdrant_url,timeout=10)
+        # Get the embedding dimension from the model instead of embedding a probe string
+        self.embedding_dimension = self.embeddings.dimension
 
-        # Get the embedding dimension
-        self.embedding_dimension = len(self.embeddings.embed_query("test"))
+        # Worker processes for parsing PDFs in page ranges
+        self.parse_workers = max(1, (os.cpu_count() or 2) - 1)
+        self.pages_per_shard = 10
+
+        # Content hashes and chunk IDs of every document already in the collection
+        self.registry = DocumentRegistry(registry_path)
 
     def load_document(self, file_path: str):
         _, file_extension = os.path.splitext(file_path)
         file_extension = file_extension.lower()
 
+        if file_extension == '.json':
+            return self.load_json(file_path)
+        return get_loader(file_path, file_extension).load()
+
+    def iter_pdf_documents(self, file_path: str, progress=None) -> Iterator[Document]:
+        """Parse a PDF in page-range shards on a process pool, yielding documents in page order."""
+        shard_dir = tempfile.mkdtemp(prefix="pdf_shards_")
+        try:
+            shards = list(shard_pdf(file_path, self.pages_per_shard, shard_dir))
+            # Spawned, not forked: this runs on an ingestion thread of the Streamlit server, whose
+            # torch, query-batcher and tornado threads must not be copied into the workers
+            with ProcessPoolExecutor(
+                max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                pending = deque()
+                parsed = 0
+                for shard_path, first_page, last_page in shards:
+                    # Keep only a couple of shards per worker in flight to bound memory
+                    if len(pending) >= 2 * self.parse_workers:
+                        yield from pending.popleft().result()
+                        parsed += 1
+                        if progress:
+                            progress("loading", parsed, len(shards))
+                    pending.append(executor.submit(load_pdf_shard, shard_path, file_path, first_page, last_page))
+                while pending:
+                    yield from pending.popleft().result()
+                    parsed += 1
+                    if progress:
+                        progress("loading", parsed, len(shards))
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    def iter_documents(self, file_path: str, progress=None) -> Iterator[Document]:
+        """Lazily load a file: PDFs are parsed in parallel, other loaders stream with lazy_load()."""
+        _, file_extension = os.path.splitext(file_path)
+        file_extension = file_extension.lower()
+
         if file_extension == '.pdf':
-            return UnstructuredPDFLoader(file_path).load()
-        elif file_extension == '.md':
-            return UnstructuredMarkdownLoader(file_path).load()
-        elif file_extension in ['.ppt', '.pptx']:
-            return UnstructuredPowerPointLoader(file_path).load()
-        elif file_extension == '.csv':
-            return CSVLoader(file_path).load()
-        elif file_extension in ['.xls', '.xlsx']:
-            return UnstructuredExcelLoader(file_path).load()
+            return self.iter_pdf_documents(file_path, progress)
         elif file_extension == '.json':
-            return self.load_json(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_extension}")
+            return iter(self.load_json(file_path))
+        return get_loader(file_path, file_extension).lazy_load()
 
     def load_json(self, file_path: str) -> List[Document]:
         with open(file_path, 'r') as file:
@@ -90,55 +170,140 @@ class EmbeddingsManager:
         
         return splitter.split_documents(docs)
 
-    def create_embeddings(self, file_path: str):
+    def iter_splits(self, docs: Iterator[Document], file_extension: str) -> Iterator[Document]:
+        # Split documents as they arrive, so the embedder can start before parsing finishes
+        for doc in docs:
+            yield from self.split_documents([doc], file_extension)
+
+    def iter_point_pages(self, splits: Iterator[tuple], page_size: int = 64, progress=None, sparse_encoder=None):
+        # Embed one page of (point ID, document) pairs at a time and lay the payload out
+        # the way the langchain Qdrant store reads it
+        embedded = 0
+        for page in iter_pages(splits, page_size):
+            texts = [doc.page_content for _, doc in page]
+            if sparse_encoder:
+                # Dense and lexical vectors from one forward pass, prepared like embed_documents does
+                vectors, sparse_vectors = sparse_encoder.encode_hybrid(
+                    [text.replace("\n", " ") for text in texts],
+                    normalize_embeddings=self.encode_kwargs.get("normalize_embeddings", False)
+                )
+                vectors = vectors.tolist()
+            else:
+                vectors = self.embeddings.embed_documents(texts)
+                sparse_vectors = [None] * len(page)
+            embedded += len(page)
+            if progress:
+                progress("embedding", embedded, None)
+            yield [
+                rest.PointStruct(
+                    id=doc_id,
+                    vector=point_vector(vector, sparse_vector),
+                    payload={"page_content": doc.page_content, "metadata": doc.metadata}
+                )
+                for (doc_id, doc), vector, sparse_vector in zip(page, vectors, sparse_vectors)
+            ]
+
+    def remove_points(self, point_ids):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=rest.PointIdsList(points=sorted(point_ids)),
+            wait=True
+        )
+        bump_collection_version(self.collection_name)
+
+    def create_embeddings(self, file_path: str, progress=None, source: str = None):
+        # `progress(stage, done, total)` is called as the file moves through the stages
+        if progress is None:
+            progress = lambda stage, done, total: None
+
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"The file {file_path} does not exist.")
 
+        # Documents are registered under their upload name, not the temporary copy's path
+        source = source or os.path.basename(file_path)
+        digest = file_hash(file_path)
+
         # Load and preprocess the document
         _, file_extension = os.path.splitext(file_path)
         file_extension = file_extension.lower()
 
-        if file_extension == '.json':
-            docs = self.load_json(file_path)
-        else:
-            docs = self.load_document(file_path)
+        # Check if collection exists, if not create it with named dense + sparse vectors,
+        # int8 quantization and the HNSW settings from collection_setup
+        try:
+            if ensure_collection(self.client, self.collection_name, self.embedding_dimension):
+                # Nothing recorded for a fresh collection is in it anymore
+                self.registry.reset(self.collection_name)
+            # Collections created before hybrid search keep their single unnamed dense vector
+            hybrid = is_hybrid_collection(self.client, self.collection_name)
+        except Exception as e:
+            raise ConnectionError(f"Failed to connect to Qdrant or create embeddings: {e}")
+
+        # The same bytes were already indexed, under this or another name, and its points are still there
+        indexed_as = self.registry.find(self.collection_name, digest)
+        if indexed_as is not None:
+            indexed_ids = self.registry.get(self.collection_name, indexed_as)["point_ids"]
+            if len(existing_point_ids(self.client, self.collection_name, indexed_ids)) == len(indexed_ids):
+                return f"✅ {source} is already in the Vector DB (indexed as {indexed_as}), nothing to embed."
+
+        # A new version of a known file only embeds the chunks that changed (or went missing from the collection)
+        previous = self.registry.get(self.collection_name, source)
+        known_ids = existing_point_ids(self.client, self.collection_name, previous["point_ids"]) if previous else set()
+        seen_ids = set()
 
-        if not docs:
+        # Documents stream from the parser through the splitter into the embedder
+        progress("loading", 0, None)
+        docs = self.iter_documents(file_path, progress)
+        first_doc = next(docs, None)
+        if first_doc is None:
             raise ValueError("No documents were loaded from the file.")
 
-        splits = self.split_documents(docs, file_extension)
-        if not splits:
+        splits = self.iter_splits(chain([first_doc], docs), file_extension)
+        first_split = next(splits, None)
+        if first_split is None:
             raise ValueError("No text chunks were created from the documents.")
+        splits = chain([first_split], splits)
+
+        def new_splits():
+            # Point IDs hash the chunk content, so unchanged chunks are skipped before embedding
+            for doc in splits:
+                doc.metadata["source"] = source
+                doc_id = point_id({"identifier": source, "type": "document", "content": doc.page_content})
+                if doc_id in seen_ids:
+                    continue
+                seen_ids.add(doc_id)
+                if doc_id not in known_ids:
+                    yield doc_id, doc
 
         # Create and store embeddings in Qdrant with HNSW index
         try:
-            # Check if collection exists, if not create it with HNSW index
-            collections = self.client.get_collections().collections
-            if not any(collection.name == self.collection_name for collection in collections):
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=rest.VectorParams(
-                        size=self.embedding_dimension,
-                        distance=rest.Distance.COSINE
-                    ),
-                    # hnsw_config=rest.HnswConfigDiff(
-                    #     m=16,
-                    #     ef_construct=100,
-                    #     full_scan_threshold=10000
-                    # )
-                )
-
-            # Create Qdrant instance with HNSW index
-            qdrant = Qdrant(
-                client=self.client,
-                collection_name=self.collection_name,
-                embeddings=self.embeddings,
+            # Embed and upsert the documents page by page with a few requests in flight
+            # Embedding of the next page overlaps with the upserts of the previous ones
+            upserted = upsert_pages(
+                self.client,
+                self.collection_name,
+                self.iter_point_pages(
+                    new_splits(),
+                    progress=progress,
+                    sparse_encoder=get_sparse_encoder(self.model_name, self.device) if hybrid else None
+                ),
+                max_in_flight=4,
+                progress=lambda done: progress("upserting", done, None)
             )
 
-            # Add documents to the collection
-            qdrant.add_documents(splits)
+            # Chunks of the previous version that are gone from this one
+            stale_ids = known_ids - seen_ids
+            if stale_ids:
+                self.remove_points(stale_ids)
 
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Qdrant or create embeddings: {e}")
 
-        return "✅ Vector DB Successfully Created and Stored in Qdrant with HNSW index!"
\ No newline at end of file
+        self.registry.set(self.collection_name, source, digest, seen_ids)
+        self.registry.save()
+
+        if previous is None:
+            return "✅ Vector DB Successfully Created and Stored in Qdrant with HNSW index!"
+        return (
+            f"✅ {source} updated: {upserted} new or changed chunks embedded, "
+            f"{len(stale_ids)} removed, {len(seen_ids) - upserted} unchanged."
+        )
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from langchain.prompts import PromptTemplate
+from qdrant_client import AsyncQdrantClient
+from hybrid import collection_is_hybrid, query_kwargs
+from query_router import route_query
+from resources import (
+    get_chat_ollama, get_query_embeddings, get_hybrid_query_embeddings, get_response_cache, get_context_builder
+)
+
+PROMPT_TEMPLATE = """
+You are a chatbot for the Rishabh Software website. Your task is to provide helpful answers based solely on the given Context and Question. Please follow these guidelines:
+
+Carefully read and analyze the provided Context.
+Answer the Question using only the information found in the Context.
+Provide a detailed and helpful answer, using bullet points where appropriate.
+Do not invent or include any information that is not present in the Context.
+If the answer cannot be found in the Context, respond with "I'm sorry, but I don't have enough information to answer that question based on the provided context."
+
+Context: {context}
+Question: {question}
+Please provide your helpful answer below:
+"""
+
+
+class AsyncRAGPipeline:
+    """Asyncio embed -> search -> generate pipeline for serving many chats from one process.
+
+    Encoding runs on a bounded thread pool feeding the micro-batching
+    encoder, Qdrant is queried with AsyncQdrantClient (one fused dense +
+    sparse query on hybrid collections) and the answer is
+    streamed with ChatOllama.astream.
+    At most `max_concurrency` requests run at once; the rest wait for a slot,
+    and every request (including the wait) is bounded by `request_timeout`.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-m3",
+        qdrant_url: str = "http://localhost:6333",
+        collection_name: str = "Rishabh_Collection",
+        llm_model: str = "llama3.2:3b",
+        llm_temperature: float = 0,
+        prompt_template: str = PROMPT_TEMPLATE,
+        top_k: int = 5,
+        max_concurrency: int = 16,
+        encoder_workers: int = 8,
+        request_timeout: float = 120.0,
+        max_context_tokens: int = 1500,
+    ):
+        self.collection_name = collection_name
+        self.llm_model = llm_model
+        self.llm_temperature = llm_temperature
+        self.prompt_template = prompt_template
+        self.top_k = top_k
+        self.request_timeout = request_timeout
+
+        self.model_name = model_name
+        self.query_embeddings = get_query_embeddings(model_name)
+        self.hybrid = None
+        self.response_cache = get_response_cache()
+        self.context_builder = get_context_builder(max_tokens=max_context_tokens)
+        self.client = AsyncQdrantClient(url=qdrant_url, timeout=10)
+        self.llm = get_chat_ollama(model=llm_model, temperature=llm_temperature)
+        self.prompt = PromptTemplate(template=prompt_template, input_variables=['context', 'question'])
+
+        # Encoder calls block until the micro-batcher answers, so a few threads keep it fed
+        self.executor = ThreadPoolExecutor(max_workers=encoder_workers, thread_name_prefix="encoder")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def encode(self, query: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.query_embeddings.encode, query)
+
+    async def is_hybrid(self) -> bool:
+        if self.hybrid is None:
+            self.hybrid = collection_is_hybrid(await self.client.get_collection(self.collection_name))
+        return self.hybrid
+
+    async def get_similar_chunks(self, query: str, top_k: int = None):
+        hybrid = await self.is_hybrid()
+        if hybrid:
+            # Dense and lexical query vectors from one forward pass
+            loop = asyncio.get_running_loop()
+            query_vector, sparse_vector = await loop.run_in_executor(
+                self.executor, get_hybrid_query_embeddings(self.model_name).encode, query
+            )
+        else:
+            query_vector, sparse_vector = await self.encode(query), None
+        # Routed payload filter first, unfiltered search when it matches nothing
+        conditions = route_query(query)
+        for query_conditions in ([conditions, None] if conditions else [None]):
+            search_result = await self.client.query_points(
+                collection_name=self.collection_name,
+                with_payload=True,
+                **query_kwargs(query_vector, sparse_vector, hybrid, top_k or self.top_k, conditions=query_conditions)
+            )
+            if search_result.points:
+                break
+        return [hit.payload for hit in search_result.points]
+
+    async def stream_response(self, query: str):
+        """Yield the answer to `query` token by token."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_timeout
+
+        def remaining():
+            return max(deadline - loop.time(), 0)
+
+        # Backpressure: wait for a free slot, but never longer than the request budget
+        await asyncio.wait_for(self.semaphore.acquire(), timeout=remaining())
+        try:
+            cache_key = self.response_cache.key(
+                query, self.collection_name, self.prompt_template, self.llm_model, self.llm_temperature
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+            similar_chunks = await asyncio.wait_for(self.get_similar_chunks(query), timeout=remaining())
+            context = self.context_builder.build(similar_chunks)
+
+            tokens = []
+            stream = self.llm.astream(self.prompt.format(context=context, question=query)).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining())
+                    except StopAsyncIteration:
+                        break
+                    tokens.append(chunk.content)
+                    yield chunk.content
+            finally:
+                # Timed-out or abandoned requests close the LLM's HTTP stream right away
+                await stream.aclose()
+
+            self.response_cache.put(cache_key, "".join(tokens))
+        finally:
+            self.semaphore.release()
+
+    async def get_response(self, query: str) -> str:
+        try:
+            return "".join([token async for token in self.stream_response(query)])
+        except asyncio.TimeoutError:
+            return f"⚠️ The request timed out after {self.request_timeout:.0f}s."
+        except Exception as e:
+            return f"⚠️ An error occurred while processing your request: {e}"
+
+    async def close(self):
+        await self.client.close()
+        self.executor.shutdown(wait=False)
+
+
+async def main():
+    pipeline = AsyncRAGPipeline()
+    queries = [
+        "What services do you offer?",
+        "What are the challenges of Real-time Bank Fraud Detection and Prevention Software?",
+        "How can I contact Rishabh Software?",
+    ]
+    try:
+        responses = await asyncio.gather(*(pipeline.get_response(query) for query in queries))
+        for query, response in zip(queries, responses):
+            print("Query:", query)
+            print("\nResponse:", response, "\n")
+    finally:
+        await pipeline.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
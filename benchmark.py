@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from langchain.chains import LLMChain, RetrievalQA
+from langchain.prompts import PromptTemplate
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+# Ingestion bumps collection versions; keep the benchmark collection out of the repo's versions file
+os.environ["COLLECTION_VERSIONS_PATH"] = os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "collection_versions.json")
+
+from chunking import ChunkingEngine, ChunkShaper, category_for_path, load_records, tag_sections
+from ingestion import IngestionEngine
+from context_builder import ContextBuilder
+from collection_setup import ensure_collection
+from hybrid import HybridQdrantRetriever
+from query_cache import QueryEmbeddingCache
+from query_router import routed_search
+from vector_store import QdrantBackend, LocalBackend, export_collection
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Rishabh_data")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+COLLECTION_NAME = "Benchmark_Collection"
+
+# Files chunked by a rule (as in the chunking scripts); the others are upserted whole, as by upsert_file.py
+SOURCE_RULES = {"case_studies.json": "case_studies", "scraped_data.json": "service_pages"}
+
+QUERIES = [
+    "What services do you offer?",
+    "How can I contact Rishabh Software?",
+    "What are the challenges of Real-time Bank Fraud Detection and Prevention Software?",
+    "Which case studies used Hibernate?",
+    "Where are your offices located?",
+    "Do you have experience with clinical trial management systems?",
+    "What technologies were used for ELD compliance?",
+    "What AI development services do you provide?",
+]
+
+PROMPT_TEMPLATE = """Use the following pieces of information to answer the user's question.
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+Context: {context}
+Question: {question}
+
+Only return the helpful answer. Answer must be detailed and well explained.
+Helpful answer:
+"""
+
+
+def word_counts(text: str) -> dict:
+    """Hashed word -> count of a text."""
+    counts = {}
+    for word in text.lower().split():
+        term = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+class HashingEncoder:
+    """Deterministic stand-in for BGE-M3: hashed bag of words, L2-normalized, and the raw counts as lexical weights."""
+
+    def __init__(self, dimension: int = 1024):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, count in word_counts(text).items():
+                vectors[row, term % self.dimension] += count
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+    def encode_hybrid(self, texts, batch_size: int = 32, normalize_embeddings: bool = False):
+        sparse = []
+        for text in texts:
+            counts = word_counts(text)
+            sparse.append(models.SparseVector(indices=list(counts), values=[float(value) for value in counts.values()]))
+        return self.encode(list(texts)), sparse
+
+
+class EncoderEmbeddings(Embeddings):
+    """LangChain view of an encoder, used to build the RetrievalQA chain under test."""
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+
+    def embed_documents(self, texts):
+        return self.encoder.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encoder.encode(text).tolist()
+
+
+def load_sections():
+    """Sections of every data file, chunked and tagged the way the ingestion scripts do it."""
+    sections = []
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        path = os.path.join(DATA_DIR, file_name)
+        records = load_records(path)
+        if file_name in SOURCE_RULES:
+            sections += ChunkingEngine(SOURCE_RULES[file_name], shaper=ChunkShaper()).iter_sections(records)
+        else:
+            sections += tag_sections(records, category=category_for_path(path))
+    return sections
+
+
+def bench_chunking():
+    start = time.perf_counter()
+    sections = load_sections()
+    elapsed = time.perf_counter() - start
+    return sections, {"sections": len(sections), "seconds": elapsed}
+
+
+def percentiles(samples) -> dict:
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def bench_ingestion(client, encoder, sections, sparse_encoder=None):
+    # Same collection layout as the ingestion scripts: named dense + sparse vectors when hybrid
+    ensure_collection(client, COLLECTION_NAME, encoder.get_sentence_embedding_dimension(), hybrid=sparse_encoder is not None)
+    engine = IngestionEngine(encoder, batch_size=32, sparse_encoder=sparse_encoder)
+    start = time.perf_counter()
+    total = engine.upsert_stream(client, COLLECTION_NAME, sections, page_size=256, max_in_flight=4)
+    elapsed = time.perf_counter() - start
+    return {"chunks": total, "seconds": elapsed, "chunks_per_sec": total / elapsed if elapsed else 0.0}
+
+
+def rag_request(vector_store, encoder, chain, context_builder, query: str, top_k: int = 5,
+                sparse_encoder=None, route: bool = True) -> dict:
+    """The get_similar_chunks + LLM path, timed stage by stage."""
+    timings = {}
+    start = time.perf_counter()
+    if sparse_encoder is not None:
+        dense, sparse = sparse_encoder.encode_hybrid([query], batch_size=1)
+        query_vector, sparse_vector = dense[0].tolist(), sparse[0]
+    else:
+        query_vector, sparse_vector = encoder.encode(query).tolist(), None
+    timings["encode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # Routed payload filter (with the unfiltered fallback) and, on hybrid collections, fused dense + sparse search
+    search_result = routed_search(query, lambda conditions: vector_store.search(
+        query_vector, sparse_vector, limit=top_k, conditions=conditions
+    ), route)
+    timings["search"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    context = context_builder.build(hit.payload for hit in search_result)
+    timings["context"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chain.run(context=context, question=query)
+    timings["llm"] = time.perf_counter() - start
+    return timings
+
+
+def bench_requests(fn, concurrency_levels, rounds: int):
+    """Run `fn(query)` for every query `rounds` times at each concurrency level."""
+    results = {}
+    queries = QUERIES * rounds
+    for concurrency in concurrency_levels:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(fn, queries))
+        elapsed = time.perf_counter() - start
+
+        stages = {}
+        for sample in samples:
+            for stage, seconds in sample.items():
+                stages.setdefault(stage, []).append(seconds)
+        results[str(concurrency)] = {
+            "throughput_qps": len(queries) / elapsed,
+            "stages": {stage: percentiles(values) for stage, values in stages.items()},
+        }
+    return results
+
+
+def run(args) -> dict:
+    if args.real_encoder:
+        from resources import get_encoder, get_sparse_encoder
+        encoder = get_encoder("BAAI/bge-m3")
+        sparse_encoder = get_sparse_encoder("BAAI/bge-m3") if args.hybrid else None
+    else:
+        encoder = HashingEncoder()
+        sparse_encoder = encoder if args.hybrid else None
+
+    client = QdrantClient(location=":memory:")
+    fake_llm = FakeListChatModel(responses=["This is a benchmark answer."], sleep=args.llm_latency)
+    prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=['context', 'question'])
+
+    report = {
+        "encoder": "BAAI/bge-m3" if args.real_encoder else "hashing",
+        "llm_latency": args.llm_latency,
+        "backend": args.backend,
+        "hybrid": args.hybrid,
+        "routed": args.route,
+    }
+    sections, report["chunking"] = bench_chunking()
+    report["ingestion"] = bench_ingestion(client, encoder, sections, sparse_encoder)
+
+    if args.backend == "local":
+        index_dir = tempfile.mkdtemp(prefix="benchmark_index_")
+        vector_store = LocalBackend(export_collection(client, COLLECTION_NAME, os.path.join(index_dir, COLLECTION_NAME)))
+    else:
+        vector_store = QdrantBackend(client, COLLECTION_NAME)
+
+    chain = LLMChain(llm=fake_llm, prompt=prompt)
+    context_builder = ContextBuilder(max_tokens=1500)
+    report["get_similar_chunks"] = bench_requests(
+        lambda query: rag_request(
+            vector_store, encoder, chain, context_builder, query, sparse_encoder=sparse_encoder, route=args.route
+        ),
+        args.concurrency,
+        args.rounds
+    )
+
+    # ChatbotManager's retrieval QA chain, against the in-memory collection and fake model. The section
+    # payloads have no page_content, so both legs render them as HybridQdrantRetriever does
+    sparse_query_embeddings = None
+    if sparse_encoder is not None:
+        sparse_query_embeddings = QueryEmbeddingCache(
+            lambda query: sparse_encoder.encode_hybrid([query], batch_size=1)[1][0], key_fn=str
+        )
+    retriever = HybridQdrantRetriever(
+        client=client,
+        collection_name=COLLECTION_NAME,
+        embeddings=EncoderEmbeddings(encoder),
+        sparse_query_embeddings=sparse_query_embeddings,
+        k=5 if sparse_encoder is not None else 10,
+    )
+    qa = RetrievalQA.from_chain_type(
+        llm=fake_llm,
+        chain_type="stuff",
+        retriever=retriever,
+        chain_type_kwargs={"prompt": prompt},
+    )
+
+    def qa_request(query):
+        start = time.perf_counter()
+        qa(query)
+        return {"total": time.perf_counter() - start}
+
+    report["chatbot_manager"] = bench_requests(qa_request, args.concurrency, args.rounds)
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float, path=""):
+    """Return the metrics that got worse than the baseline by more than `threshold`."""
+    regressions = []
+    for key, value in report.items():
+        if key not in baseline:
+            continue
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict):
+            regressions += compare(value, baseline[key], threshold, name)
+        elif isinstance(value, float) and baseline[key]:
+            change = (value - baseline[key]) / baseline[key]
+            # Higher is better for throughput, lower is better for latencies
+            worse = -change if key.endswith(("_qps", "_per_sec")) else change
+            if worse > threshold:
+                regressions.append((name, baseline[key], value))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the RAG path.")
+    parser.add_argument("--real-encoder", action="store_true", help="Use BGE-M3 instead of the hashing encoder")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the fake LLM sleeps per answer")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrency levels to test")
+    parser.add_argument("--rounds", type=int, default=5, help="Times every query is asked per level")
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant",
+                        help="Search through Qdrant or the in-process memory-mapped index")
+    parser.add_argument("--hybrid", action="store_true", help="Dense + sparse collection and fused queries")
+    parser.add_argument("--no-route", dest="route", action="store_false", help="Skip the query_router payload filters")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.3f} -> {after:.3f}")
+        if not regressions:
+            print("No regressions against the baseline.")
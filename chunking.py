@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import uuid
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from context_builder import render_content, section_label
+
+# Chunk shaping: sections are split to about DEFAULT_TARGET_TOKENS, and runs of
+# sections under DEFAULT_MIN_TOKENS are merged up to the same size
+DEFAULT_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "384"))
+DEFAULT_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "48"))
+
+# `category` payload tag of the sections of each source file, used by query_router
+FILE_CATEGORIES = {
+    "scraped_data": "service",
+    "services_provided": "service",
+    "case_studies": "case_study",
+    "industries": "company",
+    "rishabhsoft_about_us": "company",
+    "contact_info": "contact",
+    "location": "location",
+}
+
+
+def category_for_path(path: str):
+    return FILE_CATEGORIES.get(os.path.splitext(os.path.basename(path))[0])
+
+
+def tag_sections(sections, **tags):
+    """Add the filter tags (category, industry) that are set to every section."""
+    tags = {tag: value for tag, value in tags.items() if value is not None}
+    return [dict(section, **tags) if isinstance(section, dict) else section for section in sections]
+
+
+def get_unique_identifier(dictionary):
+    """Generate a unique identifier for the dictionary."""
+    if 'url' in dictionary:
+        # Extract the last part of the URL path
+        path = urlparse(dictionary['url']).path
+        return path.split('/')[-1] or path.split('/')[-2]  # Use second-to-last if last is empty
+
+    # Fallback to other keys if 'url' is not present
+    for key in ['source', 'id']:
+        if key in dictionary:
+            return str(dictionary[key])
+
+    # If no preferred keys are found, use the first key-value pair
+    if dictionary:
+        first_key = next(iter(dictionary))
+        return f"{first_key}:{dictionary[first_key]}"
+    return "unknown"
+
+
+def split_dictionary(dictionary):
+    """Service-page rule: one section per list item / sub-key, a few sections kept whole."""
+    identifier = get_unique_identifier(dictionary)
+    sections = []
+
+    for key, value in dictionary.items():
+        if key in ['service_we_offer', 'service_banner']:
+            # Keep these sections intact
+            sections.append({"identifier": identifier, "type": key, "content": value})
+        elif key == 'service_page_tabs':
+            if isinstance(value, dict):
+                # Add main paragraph as a separate section
+                if 'main_paragraph' in value:
+                    sections.append({
+                        "identifier": identifier,
+                        "type": "service_page_tabs_main_paragraph",
+                        "content": value['main_paragraph']
+                    })
+                # Break down services
+                if 'services' in value and isinstance(value['services'], list):
+                    for i, service in enumerate(value['services']):
+                        sections.append({
+                            "identifier": identifier,
+                            "type": "service_page_tabs_service",
+                            "index": i,
+                            "content": service
+                        })
+        elif isinstance(value, list):
+            # If the value is a list, create a section for each item
+            for i, item in enumerate(value):
+                sections.append({"identifier": identifier, "type": f"{key}_item", "index": i, "content": item})
+        elif isinstance(value, dict):
+            # If the value is a dictionary, create a section for each key-value pair
+            for sub_key, sub_value in value.items():
+                sections.append({"identifier": identifier, "type": f"{key}_{sub_key}", "content": sub_value})
+
+    return tag_sections(sections, category="service")
+
+
+def break_down_dictionary(dictionary):
+    """Case-study rule: like the service pages, but simple values become sections too."""
+    identifier = dictionary.get("title", str(uuid.uuid4()))  # Use 'title' as the identifier or a UUID if missing
+    sections = []
+
+    for key, value in dictionary.items():
+        # If the key is 'key_features', 'solutions', or 'technology_used', keep it intact
+        if key in ['key_features', 'solutions', 'technology_used']:
+            sections.append({"identifier": identifier, "type": key, "content": value})
+        elif isinstance(value, dict):
+            # If the value is a dictionary, break it down further
+            for sub_key, sub_value in value.items():
+                sections.append({"identifier": identifier, "type": f"{key}_{sub_key}", "content": sub_value})
+        elif isinstance(value, list):
+            # If the value is a list, create a section for each item
+            for i, item in enumerate(value):
+                sections.append({"identifier": identifier, "type": f"{key}_item", "index": i, "content": item})
+        else:
+            # For simple values, treat them as individual sections
+            sections.append({"identifier": identifier, "type": key, "content": value})
+
+    other_details = dictionary.get("other_details")
+    industry = other_details.get("Industry") if isinstance(other_details, dict) else None
+    return tag_sections(sections, category="case_study", industry=industry)
+
+
+# Per-source chunking rules; a rule turns one source record into a list of sections
+RULES = {
+    "service_pages": split_dictionary,
+    "case_studies": break_down_dictionary,
+}
+
+
+def register_rule(name: str, rule):
+    """Add a chunking rule. It must be a module-level function so worker processes can unpickle it."""
+    RULES[name] = rule
+
+
+def approx_tokens(text: str) -> int:
+    # Same rough estimate as ContextBuilder's fallback (and picklable, unlike a lambda)
+    return len(text) // 4 + 1
+
+
+def split_sentences(text: str):
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+|\n+", text) if sentence.strip()]
+
+
+def section_key(section: dict) -> str:
+    """Stable reference to a section: identifier/type, plus #index for list items."""
+    key = f"{section.get('identifier')}/{section.get('type')}"
+    return key if section.get("index") is None else f"{key}#{section['index']}"
+
+
+class ChunkShaper:
+    """Even out the size of the sections produced by a chunking rule.
+
+    Adjacent sections of the same identifier that are under `min_tokens`
+    are merged (up to `target_tokens`); the merged section lists the keys of
+    the sections it holds in `children`. Sections over `target_tokens` are
+    split on sentence boundaries into parts that carry their `parent` key,
+    `part` and `parts`. `count_tokens` must be picklable to run on the pool.
+    """
+
+    def __init__(self, target_tokens: int = DEFAULT_TARGET_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS,
+                 count_tokens=approx_tokens):
+        self.target_tokens = target_tokens
+        self.min_tokens = min_tokens
+        self.count_tokens = count_tokens
+
+    def split(self, section: dict, text: str):
+        pieces, current, current_tokens = [], [], 0
+        for sentence in split_sentences(text):
+            tokens = self.count_tokens(sentence)
+            # A single sentence over the target still becomes one (oversize) part
+            if current and current_tokens + tokens > self.target_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += tokens
+        if current:
+            # A short tail is folded into the previous part rather than left as a near-empty vector
+            if pieces and current_tokens < self.min_tokens:
+                pieces[-1] += " " + " ".join(current)
+            else:
+                pieces.append(" ".join(current))
+        if len(pieces) == 1:
+            return [section]
+
+        parts = []
+        for i, piece in enumerate(pieces):
+            part = {key: value for key, value in section.items() if key != "content"}
+            part.update({"content": piece, "parent": section_key(section), "part": i, "parts": len(pieces)})
+            parts.append(part)
+        return parts
+
+    @staticmethod
+    def merge(run):
+        if len(run) == 1:
+            return run[0]
+        types = {section.get("type") for section in run}
+        if len(types) == 1:
+            # Items of one list stay a list under their own type
+            content = [section.get("content") for section in run]
+            section_type = run[0].get("type")
+        else:
+            content = [f"{section_label(section.get('type'))}: {render_content(section.get('content'))}" for section in run]
+            section_type = "merged"
+        # Identifier and filter tags are shared by the whole run
+        merged = {key: value for key, value in run[0].items() if key not in ("type", "index", "content")}
+        merged.update({
+            "type": section_type,
+            "index": run[0].get("index"),
+            "content": content,
+            "children": [section_key(section) for section in run],
+        })
+        return merged
+
+    def shape(self, sections):
+        shaped, run, run_tokens = [], [], 0
+
+        def flush():
+            nonlocal run, run_tokens
+            if run:
+                shaped.append(self.merge(run))
+            run, run_tokens = [], 0
+
+        for section in sections:
+            text = render_content(section.get("content"))
+            tokens = self.count_tokens(text)
+            if tokens > self.target_tokens:
+                flush()
+                shaped.extend(self.split(section, text))
+            elif tokens < self.min_tokens:
+                if run and (run[0].get("identifier") != section.get("identifier")
+                            or run_tokens + tokens > self.target_tokens):
+                    flush()
+                run.append(section)
+                run_tokens += tokens
+            else:
+                flush()
+                shaped.append(section)
+        flush()
+        return shaped
+
+
+def chunk_record(rule, shaper, record):
+    sections = rule(record)
+    return shaper.shape(sections) if shaper else sections
+
+
+def load_records(path: str):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def read_sections(path: str):
+    """Stream the sections of a JSONL artifact written by ChunkingEngine."""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ChunkingEngine:
+    """Apply a chunking rule to source records and stream the sections.
+
+    Sections come out in record order, so they can go straight into
+    IngestionEngine.sync. With `artifact_path` every section is also
+    appended to one JSONL file as it streams past, instead of one
+    pretty-printed file per section. A ChunkShaper, if given, runs on the
+    sections of each record inside the workers.
+
+    Chunking runs in process by default: for a few dozen records a pool
+    costs more than the work. With `workers > 1` a ProcessPoolExecutor on
+    the default start method is used, so the calling script needs an
+    `if __name__ == "__main__":` guard.
+    """
+
+    def __init__(self, rule, workers: int = 1, chunksize: int = 4, artifact_path: str = None,
+                 shaper: ChunkShaper = None):
+        self.rule = RULES[rule] if isinstance(rule, str) else rule
+        self.shaper = shaper
+        self.workers = workers
+        self.chunksize = chunksize
+        self.artifact_path = artifact_path
+
+    def map_records(self, records):
+        chunk = partial(chunk_record, self.rule, self.shaper)
+        if self.workers > 1:
+            with ProcessPoolExecutor(self.workers) as executor:
+                yield from executor.map(chunk, records, chunksize=self.chunksize)
+        else:
+            yield from map(chunk, records)
+
+    def iter_sections(self, records):
+        artifact = open(self.artifact_path, "w") if self.artifact_path else None
+        try:
+            for sections in self.map_records(records):
+                if artifact:
+                    artifact.writelines(json.dumps(section, ensure_ascii=False) + "\n" for section in sections)
+                yield from sections
+        finally:
+            if artifact:
+                artifact.close()
+
+    def run(self, records) -> int:
+        """Chunk every record (writing the artifact, if any) and return the number of sections."""
+        return sum(1 for _ in self.iter_sections(records))
@@ -0,0 +1,262 @@
+import os
+import time
+import argparse
+import numpy as np
+from qdrant_client.http import models
+
+# Vector names used by hybrid collections
+DENSE_VECTOR_NAME = "dense"
+SPARSE_VECTOR_NAME = "sparse"
+
+# HNSW build settings (the values that used to be commented out in the ingestion scripts)
+DEFAULT_HNSW_M = 16
+DEFAULT_EF_CONSTRUCT = 100
+DEFAULT_FULL_SCAN_THRESHOLD = 10000
+
+# Search-time knobs: a larger ef explores more of the graph, oversampling fetches
+# more candidates from the quantized vectors before rescoring them with the originals
+SEARCH_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "128"))
+SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
+# Payload fields used by filtered search; a keyword index lets Qdrant filter inside the HNSW
+# search instead of post-filtering the candidates
+PAYLOAD_INDEX_FIELDS = ("identifier", "type", "category", "industry")
+
+
+def quantization_config(quantization: str = None, always_ram: bool = True):
+    """int8 scalar or 1-bit binary quantization; the quantized copy stays in RAM."""
+    if quantization is None or quantization == "none":
+        return None
+    if quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=always_ram)
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=always_ram))
+    raise ValueError(f"Unsupported quantization: {quantization}")
+
+
+def collection_config(dimension: int, hybrid: bool = True, quantization: str = "scalar", on_disk: bool = True,
+                      hnsw_m: int = DEFAULT_HNSW_M, ef_construct: int = DEFAULT_EF_CONSTRUCT,
+                      full_scan_threshold: int = DEFAULT_FULL_SCAN_THRESHOLD) -> dict:
+    """create_collection kwargs for a COSINE collection.
+
+    With `on_disk` the float32 originals are memory-mapped and only the
+    quantized vectors and the HNSW graph are kept in RAM; the originals are
+    read back only to rescore the oversampled candidates.
+    """
+    dense = models.VectorParams(size=dimension, distance=models.Distance.COSINE, on_disk=on_disk)
+    config = {
+        "vectors_config": {DENSE_VECTOR_NAME: dense} if hybrid else dense,
+        "hnsw_config": models.HnswConfigDiff(
+            m=hnsw_m,
+            ef_construct=ef_construct,
+            full_scan_threshold=full_scan_threshold
+        ),
+        "quantization_config": quantization_config(quantization),
+    }
+    if hybrid:
+        config["sparse_vectors_config"] = {
+            SPARSE_VECTOR_NAME: models.SparseVectorParams(index=models.SparseIndexParams(on_disk=on_disk)),
+        }
+    return config
+
+
+def ensure_payload_indexes(client, collection_name: str, fields=PAYLOAD_INDEX_FIELDS):
+    """Create the missing keyword indexes on `fields`."""
+    indexed = client.get_collection(collection_name).payload_schema or {}
+    for field in fields:
+        if field not in indexed:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+                wait=True
+            )
+
+
+def ensure_collection(client, collection_name: str, dimension: int, **options) -> bool:
+    """Create the collection with `collection_config(dimension, **options)` if it is missing.
+
+    Payload indexes are added to new and existing collections alike.
+    Returns True when the collection was created, so callers can reset
+    whatever they recorded about its previous contents.
+    """
+    collections = client.get_collections().collections
+    created = not any(collection.name == collection_name for collection in collections)
+    if created:
+        client.create_collection(collection_name=collection_name, **collection_config(dimension, **options))
+    ensure_payload_indexes(client, collection_name)
+    return created
+
+
+def search_params(hnsw_ef: int = SEARCH_HNSW_EF, oversampling: float = SEARCH_OVERSAMPLING, rescore: bool = True,
+                  exact: bool = False) -> models.SearchParams:
+    # Quantization params are ignored by collections without quantization; exact search
+    # always scores the original vectors, so it is a ground truth on any copy
+    return models.SearchParams(
+        hnsw_ef=hnsw_ef,
+        exact=exact,
+        quantization=models.QuantizationSearchParams(ignore=exact, rescore=rescore, oversampling=oversampling),
+    )
+
+
+DEFAULT_SEARCH_PARAMS = search_params()
+
+
+def sample_points(client, collection_name: str, count: int, using: str = None):
+    """Return (ids, dense vectors) of up to `count` stored points."""
+    points, _ = client.scroll(
+        collection_name=collection_name, limit=count, with_payload=False, with_vectors=[using] if using else True
+    )
+    ids = [point.id for point in points]
+    vectors = [point.vector[using] if using else point.vector for point in points]
+    return ids, vectors
+
+
+def copy_dense_vectors(client, source: str, target: str, using: str = None, page_size: int = 256):
+    """Copy every point's dense vector from `source` into the (dense-only) `target` collection."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source, limit=page_size, offset=offset, with_payload=False,
+            with_vectors=[using] if using else True
+        )
+        if points:
+            client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(id=point.id, vector=point.vector[using] if using else point.vector)
+                    for point in points
+                ],
+                wait=True
+            )
+        if offset is None:
+            return
+
+
+def wait_until_indexed(client, collection_name: str, timeout: float = 600.0):
+    deadline = time.time() + timeout
+    while client.get_collection(collection_name).status != models.CollectionStatus.GREEN:
+        if time.time() > deadline:
+            raise TimeoutError(f"'{collection_name}' was not indexed within {timeout:.0f}s")
+        time.sleep(0.5)
+
+
+def search_ids(client, collection_name: str, vector, limit: int, params) -> list:
+    hits = client.query_points(
+        collection_name=collection_name, query=vector, limit=limit, search_params=params, with_payload=False
+    ).points
+    return [hit.id for hit in hits]
+
+
+def recall_report(client, collection_name: str, queries: int = 100, k: int = 5,
+                  quantizations=("none", "scalar", "binary"), ef_values=(16, 32, 64, 128, 256),
+                  oversampling_values=(1.0, 2.0, 4.0), hnsw_m: int = DEFAULT_HNSW_M,
+                  ef_construct: int = DEFAULT_EF_CONSTRUCT, keep: bool = False):
+    """Recall@k and search latency of every quantization / ef / oversampling combination.
+
+    The dense vectors of `collection_name` are copied into one scratch
+    collection per quantization; stored points are used as queries (their
+    own ID is excluded) and exact search on the original float32 vectors
+    is the ground truth.
+    """
+    from hybrid import is_hybrid_collection
+    using = DENSE_VECTOR_NAME if is_hybrid_collection(client, collection_name) else None
+    point_count = client.count(collection_name=collection_name, exact=True).count
+    query_ids, query_vectors = sample_points(client, collection_name, queries, using)
+    dimension = len(query_vectors[0])
+
+    rows = []
+    truth = None
+    try:
+        for quantization in quantizations:
+            target = f"{collection_name}__{quantization}"
+            if client.collection_exists(target):
+                client.delete_collection(target)
+            # Index every segment, even the small ones, so HNSW is what gets measured
+            client.create_collection(
+                collection_name=target,
+                optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1),
+                **collection_config(
+                    dimension, hybrid=False, quantization=quantization, on_disk=True,
+                    hnsw_m=hnsw_m, ef_construct=ef_construct, full_scan_threshold=1
+                )
+            )
+            copy_dense_vectors(client, collection_name, target, using)
+            wait_until_indexed(client, target)
+
+            if truth is None:
+                # Quantization is ignored, so the truth is the same whichever copy comes first
+                exact = search_params(exact=True)
+                truth = [
+                    [hit for hit in search_ids(client, target, vector, k + 1, exact) if hit != query_id][:k]
+                    for query_id, vector in zip(query_ids, query_vectors)
+                ]
+
+            for ef in ef_values:
+                for oversampling in (oversampling_values if quantization != "none" else (1.0,)):
+                    params = search_params(hnsw_ef=ef, oversampling=oversampling)
+                    latencies, recalls = [], []
+                    for query_id, vector, expected in zip(query_ids, query_vectors, truth):
+                        start = time.perf_counter()
+                        found = search_ids(client, target, vector, k + 1, params)
+                        latencies.append(time.perf_counter() - start)
+                        found = [hit for hit in found if hit != query_id][:k]
+                        recalls.append(len(set(found) & set(expected)) / max(len(expected), 1))
+                    latencies = np.asarray(latencies) * 1000
+                    rows.append({
+                        "quantization": quantization,
+                        "hnsw_ef": ef,
+                        "oversampling": oversampling,
+                        "recall": float(np.mean(recalls)),
+                        "p50_ms": float(np.percentile(latencies, 50)),
+                        "p95_ms": float(np.percentile(latencies, 95)),
+                    })
+    finally:
+        if not keep:
+            for quantization in quantizations:
+                target = f"{collection_name}__{quantization}"
+                if client.collection_exists(target):
+                    client.delete_collection(target)
+
+    # RAM needed by the vectors searched in memory (originals are on disk when quantized)
+    ram_bytes = {"none": 4 * dimension, "scalar": dimension, "binary": dimension / 8}
+    print(f"{point_count} points, {dimension} dims, {len(query_ids)} queries, recall@{k}")
+    print(f"{'quantization':<13}{'ef':>6}{'oversampling':>14}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}{'vector RAM':>12}")
+    for row in rows:
+        ram_mb = ram_bytes[row["quantization"]] * point_count / 2 ** 20
+        print(
+            f"{row['quantization']:<13}{row['hnsw_ef']:>6}{row['oversampling']:>14.1f}{row['recall']:>9.3f}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{ram_mb:>10.1f}MB"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of quantization and HNSW search settings.")
+    parser.add_argument("--url", default="http://localhost:6333", help="Qdrant URL")
+    parser.add_argument("--collection", default="Rishabh_Collection", help="Collection whose vectors are tested")
+    parser.add_argument("--queries", type=int, default=100, help="Stored points used as queries")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours compared per query")
+    parser.add_argument("--quantization", nargs="+", default=["none", "scalar", "binary"], help="Variants to build")
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256], help="Search-time hnsw_ef values")
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0], help="Oversampling factors")
+    parser.add_argument("--m", type=int, default=DEFAULT_HNSW_M, help="HNSW m of the scratch collections")
+    parser.add_argument("--ef-construct", type=int, default=DEFAULT_EF_CONSTRUCT, help="HNSW ef_construct")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    recall_report(
+        QdrantClient(url=args.url, timeout=60),
+        args.collection,
+        queries=args.queries,
+        k=args.k,
+        quantizations=args.quantization,
+        ef_values=args.ef,
+        oversampling_values=args.oversampling,
+        hnsw_m=args.m,
+        ef_construct=args.ef_construct,
+        keep=args.keep,
+    )
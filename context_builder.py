@@ -0,0 +1,91 @@
+import re
+import hashlib
+
+
+def token_counter(tokenizer):
+    """Token counting function backed by a Hugging Face tokenizer."""
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def render_content(content) -> str:
+    """Render a payload value as plain text lines instead of indented JSON."""
+    if isinstance(content, dict):
+        lines = []
+        for key, value in content.items():
+            rendered = render_content(value)
+            if "\n" in rendered:
+                lines.append(f"{key}:\n{rendered}")
+            elif rendered:
+                lines.append(f"{key}: {rendered}")
+        return "\n".join(lines)
+    if isinstance(content, list):
+        items = (render_content(item) for item in content)
+        return "\n".join(f"- {item}" for item in items if item)
+    if content is None:
+        return ""
+    return re.sub(r"[ \t]+", " ", str(content)).strip()
+
+
+def section_label(section_type: str) -> str:
+    return re.sub(r"_item$", "", section_type or "").replace("_", " ").strip()
+
+
+class ContextBuilder:
+    """Build a compact, de-duplicated, token-budgeted prompt context from search hits.
+
+    Hits sharing an `identifier` are grouped under one header, repeated
+    content is dropped, and sections are taken in score order until
+    `max_tokens` (counted with `count_tokens`) is reached.
+    """
+
+    def __init__(self, max_tokens: int = 1500, count_tokens=None):
+        self.max_tokens = max_tokens
+        # Rough fallback when no tokenizer is supplied
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+
+    def parse(self, payload: dict):
+        """Return (identifier, label, text) for a section payload or a LangChain document payload."""
+        if "page_content" in payload:
+            source = (payload.get("metadata") or {}).get("source", "document")
+            return source, "", render_content(payload["page_content"])
+        identifier = payload.get("identifier", "")
+        if "content" in payload:
+            return identifier, section_label(payload.get("type")), render_content(payload["content"])
+        rest = {key: value for key, value in payload.items() if key not in ("identifier", "type", "index")}
+        return identifier, section_label(payload.get("type")), render_content(rest)
+
+    def build(self, payloads) -> str:
+        groups = {}
+        seen = set()
+        used_tokens = 0
+
+        for payload in payloads:
+            identifier, label, text = self.parse(payload)
+            if not text:
+                continue
+            digest = hashlib.sha1(text.lower().encode("utf-8")).digest()
+            if digest in seen:
+                continue
+
+            if not label:
+                line = text
+            elif "\n" in text:
+                line = f"{label}:\n{text}"
+            else:
+                line = f"{label}: {text}"
+            cost = self.count_tokens(line)
+            if identifier not in groups:
+                cost += self.count_tokens(f"[{identifier}]")
+            if used_tokens + cost > self.max_tokens:
+                # A smaller, lower-ranked section may still fit
+                continue
+
+            seen.add(digest)
+            used_tokens += cost
+            groups.setdefault(identifier, []).append(line)
+
+        blocks = []
+        for identifier, lines in groups.items():
+            header = f"[{identifier}]\n" if identifier else ""
+            blocks.append(header + "\n".join(lines))
+        return "\n\n".join(blocks)
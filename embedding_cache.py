@@ -0,0 +1,322 @@
+import os
+import time
+import fcntl
+import atexit
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Default location of the on-disk cache, shared by every script and app in the repo
+DEFAULT_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache")
+)
+
+KEY_SIZE = 16
+
+# Rows per cache: the site sections, uploaded document chunks and distinct queries fit many times over,
+# and a 1024-dim cache stays at 80 MB of vectors
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+
+# `log.i64`: an 8-byte epoch, then the row numbers changed under it; compacted past this many entries per row
+LOG_HEADER_SIZE = 8
+LOG_COMPACT_FACTOR = 4
+
+# Lexical (sparse) vectors are cached as fixed-size rows of their highest-weighted terms:
+# SPARSE_CACHE_TERMS token IDs (as float32, exact below 2**24) followed by their weights
+SPARSE_CACHE_TERMS = 512
+
+
+def pack_sparse(indices, values, max_terms: int = SPARSE_CACHE_TERMS) -> np.ndarray:
+    """Fixed-size float32 row for a sparse vector; only the `max_terms` highest weights are kept."""
+    indices = np.asarray(indices, dtype=np.float32)
+    values = np.asarray(values, dtype=np.float32)
+    if len(values) > max_terms:
+        top = np.argpartition(-values, max_terms - 1)[:max_terms]
+        indices, values = indices[top], values[top]
+    row = np.full(2 * max_terms, -1.0, dtype=np.float32)
+    row[:len(indices)] = indices
+    row[max_terms:max_terms + len(values)] = values
+    return row
+
+
+def unpack_sparse(row: np.ndarray):
+    """(indices, values) lists of a row written by `pack_sparse`."""
+    max_terms = len(row) // 2
+    count = int((row[:max_terms] >= 0).sum())
+    return row[:count].astype(np.int64).tolist(), row[max_terms:max_terms + count].tolist()
+
+
+class EmbeddingCache:
+    """Size-bounded embedding cache backed by memory-mapped files.
+
+    Row `i` of `vectors.f32` holds the embedding whose key is row `i` of
+    `keys.u8`; `last_used.i64` holds a last-used time per row, which is
+    used to evict the least recently used rows when the cache is full.
+    All three are mapped shared, so writes are visible to every process
+    at once and reach the disk lazily.
+
+    Several processes can share a cache directory: rows are allocated and
+    written under an exclusive `flock` on `lock`, and every allocated or
+    evicted row number is appended to `log.i64`. Before using its key ->
+    row map a process applies only the log entries it has not seen yet
+    (the whole map is rebuilt after the log is compacted, which bumps the
+    epoch in its first 8 bytes). Lookups hold a shared lock so a row
+    cannot be reused for another key while it is being read.
+    """
+
+    def __init__(self, model_name: str, dimension: int, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        namespace = f"{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:12]}_{dimension}"
+        self.directory = os.path.join(cache_dir, namespace)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, "lock"), "a+b")
+        self._log_fd = os.open(os.path.join(self.directory, "log.i64"), os.O_RDWR | os.O_CREAT, 0o644)
+
+        with self._file_lock(fcntl.LOCK_EX):
+            self._vectors = self._map("vectors.f32", np.float32, (max_entries, dimension))
+            self._keys = self._map("keys.u8", np.uint8, (max_entries, KEY_SIZE))
+            self._last_used = self._map("last_used.i64", np.int64, (max_entries,))
+            if os.fstat(self._log_fd).st_size < LOG_HEADER_SIZE:
+                os.pwrite(self._log_fd, (0).to_bytes(LOG_HEADER_SIZE, "little"), 0)
+            self._epoch = None
+            self._sync_locked()
+
+        atexit.register(self.flush)
+
+    def _map(self, name: str, dtype, shape) -> np.memmap:
+        # Grow (never truncate) the file: other processes may have it mapped
+        path = os.path.join(self.directory, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    @contextmanager
+    def _file_lock(self, operation):
+        fcntl.flock(self._lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _sync_locked(self):
+        """Apply the rows other processes changed since the last call (all rows after a log compaction)."""
+        epoch = int.from_bytes(os.pread(self._log_fd, LOG_HEADER_SIZE, 0), "little")
+        size = os.fstat(self._log_fd).st_size
+        if epoch != self._epoch:
+            self._epoch = epoch
+            self._log_offset = size
+            self._rebuild()
+        elif size > self._log_offset:
+            changed = np.frombuffer(os.pread(self._log_fd, size - self._log_offset, self._log_offset), dtype=np.int64)
+            self._log_offset = size
+            for row in changed.tolist():
+                self._apply_row(row)
+
+    def _rebuild(self):
+        # Private copy of the keys this process has applied, to find the stale map entry of a changed row
+        self._known = np.array(self._keys)
+        used = self._known.any(axis=1)
+        self._rows = {self._known[row].tobytes(): row for row in np.flatnonzero(used).tolist()}
+        self._free_rows = np.flatnonzero(~used)[::-1].tolist()
+
+    def _apply_row(self, row: int):
+        if row >= self.max_entries:
+            return
+        old = self._known[row].tobytes()
+        if self._rows.get(old) == row:
+            del self._rows[old]
+        self._known[row] = self._keys[row]
+        if self._known[row].any():
+            self._rows[self._known[row].tobytes()] = row
+        else:
+            self._free_rows.append(row)
+
+    def _append_log_locked(self, rows):
+        # Caller holds the exclusive file lock and has applied every earlier log entry
+        if not rows:
+            return
+        size = os.fstat(self._log_fd).st_size
+        if size + 8 * len(rows) > LOG_HEADER_SIZE + 8 * LOG_COMPACT_FACTOR * self.max_entries:
+            # Start a new, empty log; other processes see the new epoch and rebuild their map
+            self._epoch += 1
+            os.ftruncate(self._log_fd, LOG_HEADER_SIZE)
+            os.pwrite(self._log_fd, self._epoch.to_bytes(LOG_HEADER_SIZE, "little"), 0)
+            self._log_offset = LOG_HEADER_SIZE
+            return
+        os.pwrite(self._log_fd, np.asarray(rows, dtype=np.int64).tobytes(), size)
+        self._log_offset = size + 8 * len(rows)
+
+    def key(self, text: str, normalize: bool) -> bytes:
+        digest = hashlib.sha256(f"{self.model_name}\0{int(normalize)}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.digest()[:KEY_SIZE]
+
+    def get_many(self, keys: List[bytes]):
+        """Return (vectors, missing) where `missing` lists the positions not in the cache."""
+        vectors = np.empty((len(keys), self.dimension), dtype=np.float32)
+        missing = []
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_SH):
+                self._sync_locked()
+                now = time.time_ns()
+                for position, key in enumerate(keys):
+                    row = self._rows.get(key)
+                    if row is None:
+                        missing.append(position)
+                        continue
+                    vectors[position] = self._vectors[row]
+                    # Recency goes straight to the shared map; the kernel writes it back lazily
+                    self._last_used[row] = now
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def put_many(self, keys: List[bytes], vectors):
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync_locked()
+            now = time.time_ns()
+            changed = []
+            for key, vector in zip(keys, vectors):
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._allocate_row(changed)
+                    self._keys[row] = np.frombuffer(key, dtype=np.uint8)
+                    self._known[row] = self._keys[row]
+                    self._rows[key] = row
+                    changed.append(row)
+                self._vectors[row] = vector
+                self._last_used[row] = now
+            # Only the allocated (and evicted) row numbers are logged, never the whole index
+            self._append_log_locked(changed)
+
+    def _allocate_row(self, changed) -> int:
+        while True:
+            if not self._free_rows:
+                self._evict(changed)
+            row = self._free_rows.pop()
+            # Entries can be stale when another process reused the row before this one saw it freed
+            if not self._known[row].any():
+                return row
+
+    def _evict(self, changed):
+        # Free the least recently used tenth of the cache in one go
+        count = max(1, self.max_entries // 10)
+        rows = np.argpartition(self._last_used, count - 1)[:count].tolist()
+        for row in rows:
+            self._rows.pop(self._known[row].tobytes(), None)
+            self._keys[row] = 0
+            self._known[row] = 0
+            self._last_used[row] = 0
+            self._free_rows.append(row)
+        changed.extend(rows)
+        self.evictions += len(rows)
+
+    def flush(self):
+        """Write the mapped files back to disk (the kernel also does so on its own)."""
+        with self._lock:
+            for array in (self._vectors, self._keys, self._last_used):
+                array.flush()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedSentenceTransformer:
+    """Drop-in wrapper around a SentenceTransformer whose `encode` goes through an EmbeddingCache."""
+
+    def __init__(self, encoder, model_name: str, cache: EmbeddingCache = None, **cache_kwargs):
+        self.encoder = encoder
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache(model_name, encoder.get_sentence_embedding_dimension(), **cache_kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.encoder, name)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.cache.dimension
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        keys = [self.cache.key(text, normalize_embeddings) for text in texts]
+        vectors, missing = self.cache.get_many(keys)
+
+        if missing:
+            # Encode each distinct missing text once, even if it repeats within the call
+            unique = {}
+            for position in missing:
+                unique.setdefault(keys[position], texts[position])
+            encoded = self.encoder.encode(
+                list(unique.values()),
+                batch_size=batch_size,
+                normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=True,
+                **kwargs
+            )
+            self.cache.put_many(list(unique), encoded)
+            rows = dict(zip(unique, encoded))
+            for position in missing:
+                vectors[position] = rows[keys[position]]
+
+        return vectors[0] if single else vectors
+
+
+class CachedBgeEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that serves HuggingFaceBgeEmbeddings results from an EmbeddingCache."""
+
+    def __init__(self, embeddings, cache: EmbeddingCache = None, **cache_kwargs):
+        self.embeddings = embeddings
+        self.normalize = embeddings.encode_kwargs.get("normalize_embeddings", False)
+        self.cache = cache or EmbeddingCache(
+            embeddings.model_name, embeddings.client.get_sentence_embedding_dimension(), **cache_kwargs
+        )
+
+    @property
+    def dimension(self) -> int:
+        return self.cache.dimension
+
+    def _embed(self, texts: List[str], prefix: str, embed_fn) -> List[List[float]]:
+        # Queries get the BGE instruction prepended, so they are keyed apart from documents
+        keys = [self.cache.key(prefix + text, self.normalize) for text in texts]
+        vectors, missing = self.cache.get_many(keys)
+        if missing:
+            encoded = np.asarray(embed_fn([texts[position] for position in missing]), dtype=np.float32)
+            self.cache.put_many([keys[position] for position in missing], encoded)
+            vectors[missing] = encoded
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), "", self.embeddings.embed_documents)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if hasattr(self.embeddings, "embed_queries"):
+            embed_fn = self.embeddings.embed_queries
+        else:
+            embed_fn = lambda queries: [self.embeddings.embed_query(query) for query in queries]
+        return self._embed(list(texts), self.embeddings.query_instruction, embed_fn)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
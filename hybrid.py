@@ -0,0 +1,280 @@
+import os
+import threading
+from typing import Any, List
+import numpy as np
+from qdrant_client.http import models
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from context_builder import render_content
+from embedding_cache import pack_sparse, unpack_sparse
+from query_router import routed_search
+from collection_setup import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME, DEFAULT_SEARCH_PARAMS
+
+_hybrid_collections = {}
+_hybrid_lock = threading.Lock()
+
+
+class BgeM3SparseEncoder:
+    """BGE-M3 dense and lexical (sparse) vectors from one forward pass of an already loaded model.
+
+    The sparse head is a single linear layer on top of the token states
+    (`sparse_linear.pt` in the model repo), so it reuses the dense model's
+    weights instead of loading a second copy of BGE-M3. Every token gets
+    relu(linear(h)); repeated tokens keep their highest weight. The dense
+    vector is the pooled output of the same pass. `model` is the
+    SentenceTransformer or an OnnxEncoder; with the latter the head runs
+    in NumPy and torch is never imported.
+    """
+
+    def __init__(self, model, model_name: str = "BAAI/bge-m3"):
+        from onnx_encoder import OnnxEncoder, load_sparse_head
+
+        self.model = model
+        self.onnx = isinstance(model, OnnxEncoder)
+        if self.onnx:
+            self.weight, self.bias = load_sparse_head(model_name, os.path.dirname(model.model_path))
+        else:
+            import torch
+            from huggingface_hub import hf_hub_download
+            state = torch.load(hf_hub_download(model_name, "sparse_linear.pt"), map_location="cpu")
+            self.weight = state["weight"].reshape(-1).float().numpy()
+            self.bias = float(state["bias"].reshape(-1)[0])
+
+        tokenizer = model.tokenizer
+        self.special_ids = {
+            tokenizer.cls_token_id, tokenizer.eos_token_id, tokenizer.pad_token_id, tokenizer.unk_token_id
+        }
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def iter_batches(self, texts: List[str], batch_size: int):
+        """Yield (positions, input_ids, dense vectors, token states) for length-sorted batches of `texts`."""
+        if self.onnx:
+            for positions, input_ids, hidden in self.model.iter_batches(texts, batch_size):
+                yield positions, input_ids, self.model.pool(hidden), hidden
+            return
+
+        import torch
+
+        # Sorting by length keeps padding inside each batch to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            features = self.model.tokenize([texts[i] for i in positions])
+            features = {key: value.to(self.model.device) for key, value in features.items()}
+            with torch.inference_mode():
+                # The SentenceTransformer keeps the transformer's token states next to its pooled output
+                output = self.model(features)
+            yield (
+                positions,
+                features["input_ids"].cpu().numpy(),
+                output["sentence_embedding"].float().cpu().numpy(),
+                output["token_embeddings"].float().cpu().numpy(),
+            )
+
+    def lexical_weights(self, input_ids, weights) -> models.SparseVector:
+        lexical = {}
+        for token_id, weight in zip(input_ids, weights):
+            if token_id in self.special_ids or weight <= 0:
+                continue
+            if weight > lexical.get(token_id, 0.0):
+                lexical[token_id] = weight
+        return models.SparseVector(indices=list(lexical), values=list(lexical.values()))
+
+    def encode_hybrid(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = False):
+        """Return (dense float32 matrix, sparse vectors) of `texts`, in order."""
+        texts = list(texts)
+        dense = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        sparse = [None] * len(texts)
+        for positions, input_ids, vectors, token_states in self.iter_batches(texts, batch_size):
+            if normalize_embeddings:
+                vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            dense[positions] = vectors
+            weights = np.maximum(token_states @ self.weight + self.bias, 0.0)
+            for position, ids, row in zip(positions, input_ids.tolist(), weights.tolist()):
+                sparse[position] = self.lexical_weights(ids, row)
+        return dense, sparse
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> List[models.SparseVector]:
+        return self.encode_hybrid(texts, batch_size)[1]
+
+    def encode_query(self, query: str) -> models.SparseVector:
+        return self.encode([query])[0]
+
+
+class CachedHybridEncoder:
+    """BgeM3SparseEncoder whose dense and lexical vectors are served from on-disk EmbeddingCaches.
+
+    Dense entries use the same keys as CachedSentenceTransformer, so a
+    chunk encoded by either is reused by the other; texts missing from
+    either cache get a single forward pass for both vectors.
+    """
+
+    def __init__(self, encoder: BgeM3SparseEncoder, dense_cache, sparse_cache):
+        self.encoder = encoder
+        self.dense_cache = dense_cache
+        self.sparse_cache = sparse_cache
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dense_cache.dimension
+
+    def encode_hybrid(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = False):
+        texts = list(texts)
+        dense_keys = [self.dense_cache.key(text, normalize_embeddings) for text in texts]
+        sparse_keys = [self.sparse_cache.key(text, False) for text in texts]
+        dense, dense_missing = self.dense_cache.get_many(dense_keys)
+        rows, sparse_missing = self.sparse_cache.get_many(sparse_keys)
+        missing = sorted(set(dense_missing) | set(sparse_missing))
+
+        sparse = [None] * len(texts)
+        if missing:
+            # Encode each distinct missing text once, even if it repeats within the call
+            unique = list(dict.fromkeys(texts[position] for position in missing))
+            encoded_dense, encoded_sparse = self.encoder.encode_hybrid(unique, batch_size, normalize_embeddings)
+            packed = [pack_sparse(vector.indices, vector.values) for vector in encoded_sparse]
+            self.dense_cache.put_many([self.dense_cache.key(text, normalize_embeddings) for text in unique], encoded_dense)
+            self.sparse_cache.put_many([self.sparse_cache.key(text, False) for text in unique], packed)
+            encoded = dict(zip(unique, zip(encoded_dense, packed)))
+            for position in missing:
+                dense[position], rows[position] = encoded[texts[position]]
+
+        # Fresh vectors go through the same packing as cached ones, so both are identical
+        for position, row in enumerate(rows):
+            indices, values = unpack_sparse(row)
+            sparse[position] = models.SparseVector(indices=indices, values=values)
+        return dense, sparse
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> List[models.SparseVector]:
+        return self.encode_hybrid(texts, batch_size)[1]
+
+    def encode_query(self, query: str) -> models.SparseVector:
+        return self.encode([query])[0]
+
+
+def collection_is_hybrid(collection_info) -> bool:
+    sparse_vectors = collection_info.config.params.sparse_vectors or {}
+    return SPARSE_VECTOR_NAME in sparse_vectors
+
+
+def is_hybrid_collection(client, collection_name: str) -> bool:
+    """Whether the collection stores named dense + sparse vectors (checked once per client)."""
+    key = (id(client), collection_name)
+    with _hybrid_lock:
+        if key in _hybrid_collections:
+            return _hybrid_collections[key]
+    # A missing collection is not remembered, it may be created as a hybrid one later
+    if not client.collection_exists(collection_name):
+        return False
+    hybrid = collection_is_hybrid(client.get_collection(collection_name))
+    with _hybrid_lock:
+        _hybrid_collections[key] = hybrid
+    return hybrid
+
+
+def point_vector(dense_vector, sparse_vector=None):
+    """Vector of a point: plain for dense-only collections, named for hybrid ones."""
+    if sparse_vector is None:
+        return dense_vector
+    return {DENSE_VECTOR_NAME: dense_vector, SPARSE_VECTOR_NAME: sparse_vector}
+
+
+def payload_filter(conditions: dict = None):
+    """Qdrant filter for {field: [allowed values]} conditions (see query_router.route_query).
+
+    Points that lack the field still match, so sections without tags (such
+    as uploaded documents in the same collection) are never filtered out.
+    """
+    if not conditions:
+        return None
+    return models.Filter(must=[
+        models.Filter(should=[
+            models.FieldCondition(key=field, match=models.MatchAny(any=list(values))),
+            models.IsEmptyCondition(is_empty=models.PayloadField(key=field)),
+        ])
+        for field, values in conditions.items()
+    ])
+
+
+def query_kwargs(dense_vector, sparse_vector=None, hybrid: bool = False, limit: int = 5,
+                 prefetch_limit: int = 20, search_params=DEFAULT_SEARCH_PARAMS, conditions: dict = None) -> dict:
+    """query_points arguments for a dense query, or an RRF-fused hybrid one.
+
+    On hybrid collections both candidate lists are fetched and fused inside
+    Qdrant, so a hybrid query is still a single request. `search_params`
+    (hnsw_ef, oversampling, rescoring) applies to the dense search, and the
+    payload `conditions` filter both candidate lists.
+    """
+    query_filter = payload_filter(conditions)
+    if not hybrid:
+        return {"query": dense_vector, "limit": limit, "search_params": search_params, "query_filter": query_filter}
+    if sparse_vector is None:
+        return {
+            "query": dense_vector, "using": DENSE_VECTOR_NAME, "limit": limit, "search_params": search_params,
+            "query_filter": query_filter,
+        }
+    return {
+        "prefetch": [
+            models.Prefetch(
+                query=dense_vector, using=DENSE_VECTOR_NAME, limit=prefetch_limit, params=search_params,
+                filter=query_filter
+            ),
+            models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME, limit=prefetch_limit, filter=query_filter),
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "limit": limit,
+    }
+
+
+def query_request(*args, **kwargs) -> models.QueryRequest:
+    """Same query as `query_kwargs`, as a QueryRequest for query_batch_points."""
+    request = query_kwargs(*args, **kwargs)
+    request["params"] = request.pop("search_params", None)
+    request["filter"] = request.pop("query_filter", None)
+    return models.QueryRequest(with_payload=True, **request)
+
+
+def search_points(client, collection_name: str, dense_vector, sparse_vector=None, limit: int = 5,
+                  prefetch_limit: int = 20, search_params=DEFAULT_SEARCH_PARAMS, conditions: dict = None):
+    """Dense search on plain collections, fused dense + sparse search on hybrid ones."""
+    hybrid = is_hybrid_collection(client, collection_name)
+    kwargs = query_kwargs(dense_vector, sparse_vector, hybrid, limit, prefetch_limit, search_params, conditions)
+    return client.query_points(collection_name=collection_name, with_payload=True, **kwargs).points
+
+
+class HybridQdrantRetriever(BaseRetriever):
+    """LangChain retriever that runs a single fused dense + sparse Qdrant query.
+
+    Without `sparse_query_embeddings` it runs a plain dense search.
+    """
+
+    client: Any
+    collection_name: str
+    embeddings: Any
+    sparse_query_embeddings: Any = None
+    k: int = 5
+    prefetch_limit: int = 20
+    # Filter by the payload conditions query_router reads from the question
+    route: bool = False
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        dense_vector = self.embeddings.embed_query(query)
+        sparse_vector = self.sparse_query_embeddings.encode(query) if self.sparse_query_embeddings is not None else None
+        hits = routed_search(query, lambda conditions: search_points(
+            self.client,
+            self.collection_name,
+            dense_vector,
+            sparse_vector,
+            limit=self.k,
+            prefetch_limit=self.prefetch_limit,
+            conditions=conditions,
+        ), self.route)
+        documents = []
+        for hit in hits:
+            payload = hit.payload or {}
+            if "page_content" in payload:
+                documents.append(Document(page_content=payload["page_content"], metadata=payload.get("metadata") or {}))
+            else:
+                # Sections written by the ingestion scripts have no page_content field
+                documents.append(Document(page_content=render_content(payload), metadata={"id": hit.id}))
+        return documents
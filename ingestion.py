@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import numpy as np
+from qdrant_client.http import models
+from hybrid import point_vector
+
+# Per-collection version stamps, bumped whenever ingestion changes a collection
+COLLECTION_VERSIONS_PATH = os.getenv(
+    "COLLECTION_VERSIONS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".collection_versions.json")
+)
+
+# Payload fields the chunking rules add for filtered search (see query_router)
+SECTION_TAGS = ("category", "industry")
+
+
+def read_collection_versions(path: str = COLLECTION_VERSIONS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def bump_collection_version(collection_name: str, path: str = COLLECTION_VERSIONS_PATH):
+    """Mark a collection as changed so caches built on top of it are invalidated."""
+    versions = read_collection_versions(path)
+    versions[collection_name] = versions.get(collection_name, 0) + 1
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(versions, f)
+    os.replace(tmp_path, path)
+
+
+def content_hash(chunk) -> str:
+    """Return the sha256 of a chunk's identifier, type, index, content and filter tags."""
+    if isinstance(chunk, dict):
+        key = [chunk.get("identifier"), chunk.get("type"), chunk.get("index"), chunk.get("content", chunk)]
+        # Tags only count when present, so untagged chunks keep their point IDs
+        tags = {tag: chunk[tag] for tag in SECTION_TAGS if tag in chunk}
+        if tags:
+            key.append(tags)
+    else:
+        key = [None, None, None, chunk]
+    serialized = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def point_id(chunk) -> str:
+    """Deterministic point ID, so an unchanged chunk always maps to the same point."""
+    return str(uuid.UUID(content_hash(chunk)[:32]))
+
+
+class IngestionManifest:
+    """Record of the point IDs each source has already written to each collection."""
+
+    def __init__(self, path: str = "ingestion_manifest.json"):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, collection_name: str, source: str) -> set:
+        return set(self.entries.get(collection_name, {}).get(source, []))
+
+    def set(self, collection_name: str, source: str, point_ids):
+        self.entries.setdefault(collection_name, {})[source] = sorted(point_ids)
+
+    def reset(self, collection_name: str):
+        """Forget everything recorded for a collection, e.g. after it was recreated."""
+        self.entries.pop(collection_name, None)
+
+    def save(self):
+        # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def existing_point_ids(client, collection_name: str, point_ids, page_size: int = 1000) -> set:
+    """The subset of `point_ids` that is still stored in the collection.
+
+    Manifests and registries are only hints: the collection may have been
+    recreated (or points deleted) by another script since they were written.
+    """
+    point_ids = sorted(point_ids)
+    existing = set()
+    for start in range(0, len(point_ids), page_size):
+        records = client.retrieve(
+            collection_name=collection_name,
+            ids=point_ids[start:start + page_size],
+            with_payload=False,
+            with_vectors=False,
+        )
+        existing.update(str(record.id) for record in records)
+    return existing
+
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """Return the sha256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentRegistry:
+    """Uploaded documents per collection: the file content hash and the point IDs of their chunks.
+
+    Documents are keyed by their upload name, so a new version of a file
+    can be diffed chunk by chunk against the previous one. Safe to share
+    between ingestion threads.
+    """
+
+    def __init__(self, path: str = "document_registry.json"):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, collection_name: str, source: str):
+        with self._lock:
+            return self.entries.get(collection_name, {}).get(source)
+
+    def find(self, collection_name: str, digest: str):
+        """Return the name a file with this content hash was indexed under, if any."""
+        with self._lock:
+            for source, entry in self.entries.get(collection_name, {}).items():
+                if entry["file_hash"] == digest:
+                    return source
+        return None
+
+    def set(self, collection_name: str, source: str, digest: str, point_ids):
+        with self._lock:
+            self.entries.setdefault(collection_name, {})[source] = {
+                "file_hash": digest,
+                "point_ids": sorted(point_ids),
+            }
+
+    def reset(self, collection_name: str):
+        with self._lock:
+            self.entries.pop(collection_name, None)
+
+    def save(self):
+        with self._lock:
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+
+def iter_pages(items, page_size: int):
+    """Yield lists of at most `page_size` items without materializing the input."""
+    iterator = iter(items)
+    while True:
+        page = list(islice(iterator, page_size))
+        if not page:
+            return
+        yield page
+
+
+def upsert_page(client, collection_name: str, points, wait_for_result: bool = False,
+                max_retries: int = 3, retry_delay: float = 1.0):
+    """Upsert a single page of points, retrying only this page on failure."""
+    for attempt in range(max_retries + 1):
+        try:
+            return client.upsert(collection_name=collection_name, points=points, wait=wait_for_result)
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_delay * 2 ** attempt)
+
+
+def upsert_pages(client, collection_name: str, pages, max_in_flight: int = 4, max_retries: int = 3,
+                 progress=None):
+    """Upsert pages of points with up to `max_in_flight` requests running at once.
+
+    Pages are sent with wait=False; the last page is held back and sent with
+    wait=True once every other page is acknowledged, so it acts as a barrier
+    for the whole run. `progress`, if given, is called with the number of
+    points upserted so far. Returns the number of points upserted.
+    """
+    total = 0
+    failed_pages = 0
+    last_page = None
+    page_sizes = {}
+
+    def collect(done):
+        nonlocal total, failed_pages
+        for future in done:
+            if future.exception() is not None:
+                failed_pages += 1
+            else:
+                total += page_sizes.pop(future)
+                if progress:
+                    progress(total)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = set()
+        for page in pages:
+            if last_page is not None:
+                # Bound the number of pages held in memory to the in-flight window
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = executor.submit(upsert_page, client, collection_name, last_page, False, max_retries)
+                page_sizes[future] = len(last_page)
+                pending.add(future)
+            last_page = page
+
+        done, _ = wait(pending)
+        collect(done)
+
+    if last_page is not None:
+        upsert_page(client, collection_name, last_page, wait_for_result=True, max_retries=max_retries)
+        total += len(last_page)
+        if progress:
+            progress(total)
+
+    if total:
+        bump_collection_version(collection_name)
+
+    if failed_pages:
+        raise RuntimeError(f"{failed_pages} page(s) could not be upserted into '{collection_name}' after {max_retries} retries.")
+    return total
+
+
+class IngestionEngine:
+    """Encode chunks in length-sorted batches and turn them into Qdrant points.
+
+    With a `sparse_encoder` the points also carry BGE-M3 lexical weights,
+    for collections created with `hybrid.hybrid_collection_config`.
+    """
+
+    def __init__(self, encoder, batch_size: int = 32, normalize_embeddings: bool = False, sparse_encoder=None):
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.normalize_embeddings = normalize_embeddings
+        self.sparse_encoder = sparse_encoder
+
+    def encode(self, texts):
+        """Encode a list of texts and return a float32 matrix in the original order."""
+        if not texts:
+            return np.empty((0, self.encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # Sorting by length keeps padding inside each batch to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), self.encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            vectors[batch_ids] = self.encoder.encode(
+                [texts[i] for i in batch_ids],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=self.normalize_embeddings,
+                show_progress_bar=False,
+            )
+        return vectors
+
+    def build_points(self, chunks):
+        """Encode `str(chunk)` for every chunk and return the matching PointStruct list."""
+        start_time = time.perf_counter()
+        texts = [str(chunk) for chunk in chunks]
+        if self.sparse_encoder is not None:
+            # Dense and lexical vectors come from the same forward pass
+            vectors, sparse_vectors = self.sparse_encoder.encode_hybrid(
+                texts, batch_size=self.batch_size, normalize_embeddings=self.normalize_embeddings
+            )
+        else:
+            vectors = self.encode(texts)
+            sparse_vectors = [None] * len(chunks)
+        points = [
+            models.PointStruct(
+                id=point_id(chunk),
+                vector=point_vector(vector.tolist(), sparse_vector),
+                payload=chunk
+            )
+            for chunk, vector, sparse_vector in zip(chunks, vectors, sparse_vectors)
+        ]
+        self.report(len(chunks), time.perf_counter() - start_time)
+        return points
+
+    def iter_point_pages(self, chunks, page_size: int = 256):
+        """Lazily encode `chunks` and yield them as pages of PointStructs."""
+        for page in iter_pages(chunks, page_size):
+            yield self.build_points(page)
+
+    def upsert_stream(self, client, collection_name: str, chunks, page_size: int = 256,
+                      max_in_flight: int = 4, max_retries: int = 3):
+        """Encode and upsert `chunks` page by page with bounded memory."""
+        start_time = time.perf_counter()
+        total = upsert_pages(
+            client,
+            collection_name,
+            self.iter_point_pages(chunks, page_size),
+            max_in_flight=max_in_flight,
+            max_retries=max_retries,
+        )
+        print(f"Upserted {total} points into '{collection_name}' in {time.perf_counter() - start_time:.2f}s")
+        return total
+
+    def sync(self, client, collection_name: str, chunks, manifest: IngestionManifest, source: str,
+             page_size: int = 256, max_in_flight: int = 4, max_retries: int = 3):
+        """Bring `source`'s points in the collection in line with `chunks`.
+
+        Only chunks whose point ID is not in the manifest (and in the collection) are encoded and
+        upserted; points recorded for `source` that no longer appear in
+        `chunks` are deleted. Returns (upserted, deleted).
+        """
+        # Recorded points the collection no longer has are encoded again
+        known_ids = existing_point_ids(client, collection_name, manifest.get(collection_name, source))
+        seen_ids = set()
+
+        def new_chunks():
+            for chunk in chunks:
+                chunk_id = point_id(chunk)
+                if chunk_id in seen_ids:
+                    continue
+                seen_ids.add(chunk_id)
+                if chunk_id not in known_ids:
+                    yield chunk
+
+        upserted = self.upsert_stream(client, collection_name, new_chunks(), page_size, max_in_flight, max_retries)
+
+        stale_ids = known_ids - seen_ids
+        if stale_ids:
+            client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=sorted(stale_ids)),
+                wait=True
+            )
+            bump_collection_version(collection_name)
+
+        manifest.set(collection_name, source, seen_ids)
+        manifest.save()
+        print(f"'{source}': {upserted} new or changed, {len(stale_ids)} stale, {len(seen_ids) - upserted} unchanged")
+        return upserted, len(stale_ids)
+
+    @staticmethod
+    def report(count: int, elapsed: float):
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print(f"Encoded {count} chunks in {elapsed:.2f}s ({rate:.1f} chunks/sec)")
@@ -1,23 +1,31 @@
-from langchain_ollama import ChatOllama
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
+import time
+from ingestion import iter_pages
+from resources import (
+    get_chat_ollama, get_encoder, get_query_embeddings, get_sparse_encoder,
+    get_hybrid_query_embeddings, get_vector_store, get_response_cache, get_context_builder
+)
+from startup import start_warmup
+from query_router import route_query, routed_search
 
-# Initialize Qdrant client
-qdrant_client = QdrantClient(host='localhost', port=6333, timeout=10)
+collection_name = "Rishabh_Collection_test"
+llm_model = "llama3.2:3b"
+llm_temperature = 0
 
-# Initialize the encoder
-encoder = SentenceTransformer("BAAI/bge-m3")
+# Answer cache; the encoder behind the query embeddings and the context builder loads on first use
+response_cache = get_response_cache()
 
 def initialize_llm(llm_model="llama3.2:3b", llm_temperature=0):
-    return ChatOllama(
+    return get_chat_ollama(
         model=llm_model,
         temperature=llm_temperature,
     )
 
 def initialize_chain(llm):
+    from langchain.chains import LLMChain
+    from langchain.prompts import PromptTemplate
     prompt_template = """Use the following pieces of information to answer the user's question fron the given Context only.
     Please go through the context thoroughly and answer the question. Give a detailed Answer.
     If you don't get the answer from the context given below, just say that you don't know, don't try to make up an answer.
@@ -37,36 +45,148 @@ def initialize_chain(llm):
     return LLMChain(llm=llm, prompt=prompt)
 
 def get_similar_chunks(query: str, top_k: int = 5):
-    query_vector = encoder.encode(query).tolist()
-    search_result = qdrant_client.search(
-        collection_name="Rishabh_Collection_test",
-        query_vector=query_vector,
-        limit=top_k
-    )
-    return [json.dumps(hit.payload, indent=2) for hit in search_result]
+    vector_store = get_vector_store(collection_name)
+    # Query embeddings: LRU + micro-batching encoder; one forward pass for dense + sparse on hybrid collections
+    if vector_store.hybrid:
+        query_vector, sparse_vector = get_hybrid_query_embeddings("BAAI/bge-m3").encode(query)
+    else:
+        query_vector, sparse_vector = get_query_embeddings("BAAI/bge-m3").encode(query), None
+    # Questions about contact details or (industry-specific) case studies only search those sections
+    search_result = routed_search(query, lambda conditions: vector_store.search(
+        query_vector, sparse_vector, limit=top_k, conditions=conditions
+    ))
+    return [hit.payload for hit in search_result]
 
 def get_response(chain, query: str) -> str:
     try:
+        # Repeated questions at temperature 0 are answered straight from the cache
+        cache_key = response_cache.key(query, collection_name, chain.prompt.template, llm_model, llm_temperature)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         # Get similar chunks
         similar_chunks = get_similar_chunks(query)
         
-        # Combine chunks into a single context string
-        context = "\n\n".join(similar_chunks)
+        # Combine chunks into a single compact, token-budgeted context string
+        context = get_context_builder(max_tokens=1500).build(similar_chunks)
         
         # Get response from the language model
         response = chain.run(context=context, question=query)
         print("Context:", context)
+        response_cache.put(cache_key, response)
         return response
     except Exception as e:
         return f"⚠️ An error occurred while processing your request: {e}"
 
-# Initialize the LLM and chain
-llm = initialize_llm(llm_model="llama3.2:3b", llm_temperature=0)
-chain = initialize_chain(llm)
+def read_questions(path: str):
+    """Yield {"id", "question"} records from a JSONL file with a "question" (or "query") field."""
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield {
+                "id": record.get("id", line_number),
+                "question": record.get("question") or record["query"],
+            }
+
+def generate_answer(chain, question: str, context: str) -> dict:
+    start = time.perf_counter()
+    cache_key = response_cache.key(question, collection_name, chain.prompt.template, llm_model, llm_temperature)
+    answer = response_cache.get(cache_key)
+    cached = answer is not None
+    error = None
+    if not cached:
+        try:
+            answer = chain.run(context=context, question=question)
+            response_cache.put(cache_key, answer)
+        except Exception as e:
+            error = str(e)
+    return {"answer": answer, "error": error, "cached": cached, "generate_ms": 1000 * (time.perf_counter() - start)}
+
+def answer_batch(chain, questions_path: str, output_path: str, batch_size: int = 32,
+                 concurrency: int = 4, top_k: int = 5):
+    """Answer every question in `questions_path` and stream the results to `output_path` as JSONL."""
+    encoder = get_encoder("BAAI/bge-m3")
+    vector_store = get_vector_store(collection_name)
+    sparse_encoder = get_sparse_encoder("BAAI/bge-m3") if vector_store.hybrid else None
+    answered = 0
+    start = time.perf_counter()
+
+    with open(output_path, 'w') as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in iter_pages(read_questions(questions_path), batch_size):
+            questions = [record["question"] for record in batch]
+
+            # Encode the whole batch in one forward pass
+            encode_start = time.perf_counter()
+            if sparse_encoder is not None:
+                vectors, sparse_vectors = sparse_encoder.encode_hybrid(questions, batch_size=batch_size)
+            else:
+                vectors = encoder.encode(questions, batch_size=batch_size)
+                sparse_vectors = [None] * len(questions)
+            encode_ms = 1000 * (time.perf_counter() - encode_start)
+
+            # Retrieve the context of every question with a single Qdrant request (or one matrix product)
+            search_start = time.perf_counter()
+            dense_vectors = [vector.tolist() for vector in vectors]
+            conditions = [route_query(question) or None for question in questions]
+            search_results = vector_store.search_batch(dense_vectors, sparse_vectors, limit=top_k, conditions=conditions)
+            # Filters that matched nothing are searched again without them
+            for i, hits in enumerate(search_results):
+                if not hits and conditions[i]:
+                    search_results[i] = vector_store.search(dense_vectors[i], sparse_vectors[i], limit=top_k)
+            search_ms = 1000 * (time.perf_counter() - search_start)
+
+            context_builder = get_context_builder(max_tokens=1500)
+            contexts = [context_builder.build(hit.payload for hit in hits) for hits in search_results]
+
+            # Generate answers with `concurrency` requests in flight against Ollama
+            results = executor.map(generate_answer, [chain] * len(batch), questions, contexts)
+            for record, result in zip(batch, results):
+                out.write(json.dumps({
+                    **record,
+                    "answer": result["answer"],
+                    "error": result["error"],
+                    "cached": result["cached"],
+                    "timings_ms": {
+                        # Encoding and search are batched, so their cost is shared across the batch
+                        "encode": encode_ms / len(batch),
+                        "search": search_ms / len(batch),
+                        "generate": result["generate_ms"],
+                    },
+                }, ensure_ascii=False) + "\n")
+                out.flush()
+            answered += len(batch)
+            print(f"Answered {answered} questions ({answered / (time.perf_counter() - start):.2f} questions/sec)")
+
+    return answered
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer questions with the Rishabh RAG chain.")
+    parser.add_argument("--questions", help="JSONL file with one {\"question\": ...} per line (enables batch mode)")
+    parser.add_argument("--output", default="answers.jsonl", help="JSONL file the answers are written to")
+    parser.add_argument("--batch-size", type=int, default=32, help="Questions encoded and searched per batch")
+    parser.add_argument("--concurrency", type=int, default=4, help="Generations in flight against Ollama")
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks retrieved per question")
+    args = parser.parse_args()
+
+    # Load BGE-M3 in the background while the LLM client and chain are set up
+    start_warmup({
+        "query embeddings": lambda: get_query_embeddings("BAAI/bge-m3"),
+        "context builder": lambda: get_context_builder(max_tokens=1500),
+    }, name="llama_response")
+
+    # Initialize the LLM and chain
+    llm = initialize_llm(llm_model=llm_model, llm_temperature=llm_temperature)
+    chain = initialize_chain(llm)
 
-# Example usage
-query = "whata re the challenges of Real-time Bank Fraud Detection and Prevention Software?"
+    if args.questions:
+        answer_batch(chain, args.questions, args.output, args.batch_size, args.concurrency, args.top_k)
+    else:
+        # Example usage
+        query = "whata re the challenges of Real-time Bank Fraud Detection and Prevention Software?"
 
-response = get_response(chain, query)
-print("Query:", query)
-print("\nResponse:", response)
\ No newline at end of file
+        response = get_response(chain, query)
+        print("Query:", query)
+        print("\nResponse:", response)
\ No newline at end of file
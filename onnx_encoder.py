@@ -0,0 +1,224 @@
+import os
+import time
+import argparse
+import numpy as np
+
+# Exported models, one directory per model name
+DEFAULT_ONNX_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".onnx_models")
+)
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+# BGE-M3's sparse_linear layer as NumPy arrays, so lexical weights need no torch at run time
+SPARSE_HEAD_FILE = "sparse_linear.npz"
+
+
+def model_dir(model_name: str, onnx_dir: str = DEFAULT_ONNX_DIR) -> str:
+    return os.path.join(onnx_dir, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name: str, output_dir: str, opset: int = 17) -> str:
+    """Export the transformer of `model_name` to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    class LastHiddenState(torch.nn.Module):
+        # Only the token states are exported; the unused pooler output would keep a fixed batch axis
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = LastHiddenState(AutoModel.from_pretrained(model_name)).eval()
+    sample = tokenizer(["Rishabh Software case study"], return_tensors="pt")
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, FP32_FILE)
+    dynamic_axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        # BGE-M3 is over 2 GB, so torch writes the weights next to the graph as external data
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": dynamic_axes,
+                "attention_mask": dynamic_axes,
+                "last_hidden_state": dynamic_axes,
+            },
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+    return path
+
+
+def export_sparse_head(model_name: str, output_dir: str) -> str:
+    """Save the weight and bias of BGE-M3's sparse_linear layer next to the exported model."""
+    import torch
+    from huggingface_hub import hf_hub_download
+
+    state = torch.load(hf_hub_download(model_name, "sparse_linear.pt"), map_location="cpu")
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, SPARSE_HEAD_FILE)
+    np.savez(path, weight=state["weight"].reshape(-1).float().numpy(), bias=state["bias"].reshape(-1).float().numpy())
+    return path
+
+
+def load_sparse_head(model_name: str, directory: str):
+    """(weight vector, bias) of the sparse head, exporting it on first use."""
+    path = os.path.join(directory, SPARSE_HEAD_FILE)
+    if not os.path.exists(path):
+        export_sparse_head(model_name, directory)
+    head = np.load(path)
+    return head["weight"].astype(np.float32), float(head["bias"][0])
+
+
+def quantize_onnx(model_path: str, output_path: str) -> str:
+    """Dynamic int8 quantization of the weights; activations are quantized at run time."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def ensure_onnx_model(model_name: str, quantized: bool = True, onnx_dir: str = DEFAULT_ONNX_DIR) -> str:
+    """Path of the exported (and optionally quantized) model, exporting it on first use."""
+    directory = model_dir(model_name, onnx_dir)
+    fp32_path = os.path.join(directory, FP32_FILE)
+    if not os.path.exists(fp32_path):
+        print(f"Exporting {model_name} to {fp32_path}")
+        export_onnx(model_name, directory)
+    if not os.path.exists(os.path.join(directory, SPARSE_HEAD_FILE)):
+        export_sparse_head(model_name, directory)
+    if not quantized:
+        return fp32_path
+    int8_path = os.path.join(directory, INT8_FILE)
+    if not os.path.exists(int8_path):
+        print(f"Quantizing {fp32_path} to int8")
+        quantize_onnx(fp32_path, int8_path)
+    return int8_path
+
+
+class OnnxEncoder:
+    """SentenceTransformer-compatible BGE-M3 encoder running on ONNX Runtime.
+
+    Pooling matches the sentence-transformers pipeline of BGE-M3 (CLS token,
+    then L2 normalization), so vectors are interchangeable with the PyTorch
+    model up to quantization error. `intra_op_threads` defaults to
+    ONNX_INTRA_OP_THREADS or the CPU count.
+    """
+
+    def __init__(self, model_path: str, intra_op_threads: int = None, max_seq_length: int = 8192):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+        self.max_seq_length = max_seq_length
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or int(os.getenv("ONNX_INTRA_OP_THREADS", os.cpu_count() or 1))
+        # One request at a time uses every intra-op thread; parallel graph branches only add contention
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def iter_batches(self, texts, batch_size: int = 32):
+        """Yield (positions, input_ids, last_hidden_state) for length-sorted batches of `texts`."""
+        # Length-sorted batches keep padding (and wasted int8 matmuls) to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            features = self.tokenizer(
+                [texts[i] for i in positions],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            input_ids = features["input_ids"].astype(np.int64)
+            hidden = self.session.run(["last_hidden_state"], {
+                "input_ids": input_ids,
+                "attention_mask": features["attention_mask"].astype(np.int64),
+            })[0]
+            yield positions, input_ids, hidden
+
+    @staticmethod
+    def pool(hidden: np.ndarray) -> np.ndarray:
+        # BGE-M3's sentence-transformers pipeline: CLS token, then always a Normalize layer
+        vectors = hidden[:, 0].astype(np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = True,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for positions, _, hidden in self.iter_batches(texts, batch_size):
+            vectors[positions] = self.pool(hidden)
+        return vectors[0] if single else vectors
+
+
+def parity(reference, candidate, texts, batch_size: int = 32) -> dict:
+    """Cosine agreement between two encoders on the same texts."""
+    a = np.asarray(reference.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+    b = np.asarray(candidate.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+    cosines = (a * b).sum(axis=1)
+    return {"mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min())}
+
+
+def throughput(encoder, texts, batch_size: int = 32, rounds: int = 3) -> float:
+    """Best texts/sec over `rounds` passes (the first call also pays warm-up)."""
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        best = max(best, len(texts) / (time.perf_counter() - start))
+    return best
+
+
+def compare(model_name: str, texts, batch_size: int = 32, min_cosine: float = 0.99):
+    """Parity and throughput of ONNX fp32 and int8 against the PyTorch SentenceTransformer."""
+    from sentence_transformers import SentenceTransformer
+    reference = SentenceTransformer(model_name, device="cpu")
+    candidates = {
+        "onnx-fp32": OnnxEncoder(ensure_onnx_model(model_name, quantized=False)),
+        "onnx-int8": OnnxEncoder(ensure_onnx_model(model_name, quantized=True)),
+    }
+
+    print(f"{len(texts)} texts, batch size {batch_size}")
+    print(f"{'backend':<12}{'texts/sec':>11}{'mean cos':>10}{'min cos':>10}")
+    print(f"{'torch':<12}{throughput(reference, texts, batch_size):>11.1f}{1.0:>10.4f}{1.0:>10.4f}")
+    for name, encoder in candidates.items():
+        agreement = parity(reference, encoder, texts, batch_size)
+        status = "" if agreement["min_cosine"] >= min_cosine else f"  below {min_cosine}"
+        print(
+            f"{name:<12}{throughput(encoder, texts, batch_size):>11.1f}"
+            f"{agreement['mean_cosine']:>10.4f}{agreement['min_cosine']:>10.4f}{status}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export BGE-M3 to ONNX and compare it with the PyTorch model.")
+    parser.add_argument("command", choices=["export", "compare"])
+    parser.add_argument("--model", default="BAAI/bge-m3", help="Hugging Face model name")
+    parser.add_argument("--samples", type=int, default=256, help="Sections of Rishabh_data used by compare")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per forward pass")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(ensure_onnx_model(args.model, quantized=True))
+    else:
+        from benchmark import load_sections
+        compare(args.model, [str(section) for section in load_sections()[:args.samples]], args.batch_size)
@@ -0,0 +1,97 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+
+class QueryBatcher:
+    """Coalesce concurrent query encodes into one batched forward pass.
+
+    Callers block in `encode` while a background thread collects queries for
+    up to `max_wait_ms` (or until `max_batch_size` are waiting), encodes them
+    with a single `encode_batch_fn` call and hands each caller its vector.
+    """
+
+    def __init__(self, encode_batch_fn, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.encode_batch_fn = encode_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.queries = 0
+        self.max_batch = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self._queue = queue.Queue()
+        self._metrics_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._worker.start()
+
+    def encode(self, query: str):
+        future = Future()
+        self._queue.put((query, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                vectors = self.encode_batch_fn([query for query, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            delays = [started - enqueued for _, _, enqueued in batch]
+            with self._metrics_lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.max_batch = max(self.max_batch, len(batch))
+                self.total_queue_delay += sum(delays)
+                self.max_queue_delay = max(self.max_queue_delay, max(delays))
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch,
+                "avg_queue_delay_ms": 1000 * self.total_queue_delay / self.queries if self.queries else 0.0,
+                "max_queue_delay_ms": 1000 * self.max_queue_delay,
+            }
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """LangChain embeddings wrapper whose `embed_query` goes through a QueryBatcher."""
+
+    def __init__(self, embeddings, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.batcher = QueryBatcher(embeddings.embed_queries, max_batch_size, max_wait_ms)
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.encode(text)
@@ -0,0 +1,128 @@
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List
+from langchain_core.embeddings import Embeddings
+from ingestion import COLLECTION_VERSIONS_PATH, read_collection_versions
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class QueryEmbeddingCache:
+    """In-process LRU of normalized query -> embedding in front of an encode function.
+
+    `key_fn` maps a query to its cache key; pass `str` for encoders that are
+    sensitive to case or punctuation.
+    """
+
+    def __init__(self, encode_fn, max_size: int = 1024, key_fn=normalize_query):
+        self.encode_fn = encode_fn
+        self.cache = LRUCache(max_size)
+        self.key_fn = key_fn
+
+    def encode(self, query: str):
+        key = self.key_fn(query)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.encode_fn(query)
+            self.cache.put(key, vector)
+        return vector
+
+
+class LRUQueryEmbeddings(Embeddings):
+    """LangChain embeddings wrapper that keeps recent query embeddings in memory."""
+
+    def __init__(self, embeddings: Embeddings, max_size: int = 1024):
+        self.embeddings = embeddings
+        self.query_cache = QueryEmbeddingCache(embeddings.embed_query, max_size)
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.query_cache.encode(text)
+
+
+class ResponseCache:
+    """Exact-answer cache for deterministic (temperature 0) generations.
+
+    Keys combine the normalized question with the collection version, the
+    prompt template, the model and the temperature, so re-ingesting the
+    collection or changing any of those invalidates old answers.
+    """
+
+    def __init__(self, max_size: int = 512, versions_path: str = COLLECTION_VERSIONS_PATH):
+        self.cache = LRUCache(max_size)
+        self.versions_path = versions_path
+        self._versions = {}
+        self._versions_mtime = None
+
+    def collection_version(self, collection_name: str) -> int:
+        # Only re-read the versions file when ingestion has touched it
+        mtime = os.path.getmtime(self.versions_path) if os.path.exists(self.versions_path) else None
+        if mtime != self._versions_mtime:
+            self._versions = read_collection_versions(self.versions_path)
+            self._versions_mtime = mtime
+        return self._versions.get(collection_name, 0)
+
+    def key(self, query: str, collection_name: str, prompt_template: str, model: str, temperature: float):
+        """Return the cache key, or None when the generation is not deterministic."""
+        if temperature != 0:
+            return None
+        template_hash = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:16]
+        return (
+            normalize_query(query),
+            collection_name,
+            self.collection_version(collection_name),
+            template_hash,
+            model,
+            temperature,
+        )
+
+    def get(self, key):
+        if key is None:
+            return None
+        return self.cache.get(key)
+
+    def put(self, key, response: str):
+        if key is not None:
+            self.cache.put(key, response)
@@ -0,0 +1,72 @@
+import re
+
+# Payload categories set at ingestion (chunking rules and FILE_CATEGORIES in chunking.py)
+CONTACT_CATEGORIES = ["contact", "location"]
+CASE_STUDY_CATEGORIES = ["case_study"]
+
+# Phrases rather than single words: "office 365", "call center" or "email marketing" are services
+CONTACT_PATTERN = re.compile(
+    r"\b(contact (you|details|info(rmation)?|numbers?)|phone numbers?|e-?mail (address|id)|"
+    r"your (e-?mail|address|offices?|locations?)|office (address|locations?)|where are you|located|"
+    r"headquarters?|reach you|get in touch)\b",
+    re.I
+)
+CASE_STUDY_PATTERN = re.compile(
+    r"\b(case stud(y|ies)|success stor(y|ies)|client stor(y|ies)|portfolio|projects?|examples?|worked (for|with|on))\b",
+    re.I
+)
+
+# Keywords of each industry, mapped to the `industry` values of the case studies (including their spelling variants)
+INDUSTRIES = {
+    ("Healthcare",): r"health ?care|medical|hospitals?|clinical|patients?",
+    ("Pharmaceutical",): r"pharma(ceutical)?s?",
+    ("FinTech", "Fintech"): r"fintech|finance|financial|banking|banks?|lending|insurance|payments?",
+    ("Logistics & SCM",): r"logistics|supply chain|scm|shipping|fleet|transportation",
+    ("Manufacturing",): r"manufactur(ing|ers?)|factory|factories",
+    ("Retail",): r"retail|e-?commerce",
+    ("Real Estate",): r"real estate|property|properties",
+    ("Travel & Hospitality",): r"travel|hospitality|hotels?|tourism",
+    ("Media & Entertainment", "Media & Entertainemnt"): r"media|entertainment|ott|streaming",
+    ("EdTech",): r"edtech|education|e-?learning",
+    ("Advertising",): r"advertising|advertisers?",
+    ("Oil & Gas",): r"oil|gas|energy",
+    ("IT", "IT Services"): r"it services",
+}
+INDUSTRY_PATTERNS = [(list(values), re.compile(rf"\b({pattern})\b", re.I)) for values, pattern in INDUSTRIES.items()]
+
+
+def route_query(query: str) -> dict:
+    """Payload conditions ({field: [allowed values]}) implied by the wording of `query`.
+
+    Contact and location questions only search contact/location entries;
+    questions about case studies only search case studies, narrowed to the
+    industries they name. Anything else returns {} (no filter). Points
+    without the field (untagged or uploaded documents) always match.
+    """
+    if CONTACT_PATTERN.search(query):
+        return {"category": CONTACT_CATEGORIES}
+    if not CASE_STUDY_PATTERN.search(query):
+        return {}
+    conditions = {"category": CASE_STUDY_CATEGORIES}
+    industries = [value for values, pattern in INDUSTRY_PATTERNS if pattern.search(query) for value in values]
+    if industries:
+        conditions["industry"] = industries
+    return conditions
+
+
+def payload_matches(payload: dict, conditions: dict) -> bool:
+    return all(payload.get(field) is None or payload.get(field) in values for field, values in conditions.items())
+
+
+def routed_search(query: str, search, route: bool = True):
+    """Run `search(conditions)` with the conditions routed from `query`.
+
+    Falls back to an unfiltered `search(None)` when the filter matches
+    nothing, e.g. on collections ingested before the payloads were tagged.
+    """
+    conditions = route_query(query) if route else {}
+    if conditions:
+        hits = search(conditions)
+        if hits:
+            return hits
+    return search(None)
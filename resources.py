@@ -0,0 +1,268 @@
+import os
+import hashlib
+import threading
+from typing import List
+from langchain_core.embeddings import Embeddings
+from embedding_cache import EmbeddingCache, CachedSentenceTransformer, CachedBgeEmbeddings, SPARSE_CACHE_TERMS
+
+# Process-wide registry of heavy, shareable objects (encoder weights, clients, LLM handles).
+# Streamlit keeps imported modules across reruns and sessions, so everything stored here is
+# built once per process no matter how many pages, sessions or managers ask for it.
+_resources = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+DEFAULT_MODEL_NAME = "BAAI/bge-m3"
+DEFAULT_QDRANT_URL = "http://localhost:6333"
+
+# Dense encoder runtime: "torch" (SentenceTransformer), "onnx" or "onnx-int8" (ONNX Runtime)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+
+# Output size of the known encoders, so collections can be set up without loading the model
+EMBEDDING_DIMENSIONS = {"BAAI/bge-m3": 1024}
+
+
+def get_resource(key, factory):
+    """Return the resource stored under `key`, building it with `factory()` on first use."""
+    resource = _resources.get(key)
+    if resource is not None:
+        return resource
+
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+
+    # Per-key lock: loading the encoder does not block creating a Qdrant client
+    with lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = factory()
+            _resources[key] = resource
+    return resource
+
+
+def get_sentence_transformer(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name, device=device)
+    return get_resource(("sentence_transformer", model_name, device), load)
+
+
+def get_dense_model(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu", backend: str = None):
+    """The model behind every dense `encode` call: the SentenceTransformer or its ONNX export."""
+    backend = backend or ENCODER_BACKEND
+    if backend == "torch":
+        return get_sentence_transformer(model_name, device)
+
+    def load():
+        from onnx_encoder import OnnxEncoder, ensure_onnx_model
+        if backend not in ("onnx", "onnx-int8"):
+            raise ValueError(f"Unsupported encoder backend: {backend}")
+        return OnnxEncoder(ensure_onnx_model(model_name, quantized=backend == "onnx-int8"))
+    return get_resource(("onnx_encoder", model_name, backend), load)
+
+
+def get_embedding_dimension(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu") -> int:
+    if model_name in EMBEDDING_DIMENSIONS:
+        return EMBEDDING_DIMENSIONS[model_name]
+    return get_dense_model(model_name, device).get_sentence_embedding_dimension()
+
+
+class LazyEncoder:
+    """Stands in for an encoder and only builds it with `factory()` when it is first used to encode.
+
+    A re-ingestion with nothing new to encode never loads the model.
+    """
+
+    def __init__(self, factory, dimension: int):
+        self.factory = factory
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def __getattr__(self, name):
+        return getattr(self.factory(), name)
+
+
+def lazy_encoder(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu", hybrid: bool = False) -> LazyEncoder:
+    """Shared dense encoder, or the dense + lexical one when `hybrid`, loaded on the first encode."""
+    factory = get_sparse_encoder if hybrid else get_encoder
+    return LazyEncoder(lambda: factory(model_name, device), get_embedding_dimension(model_name, device))
+
+
+def _cache_name(model_name: str) -> str:
+    # int8 vectors are never served to the fp32 model (or the other way around)
+    return model_name if ENCODER_BACKEND == "torch" else f"{model_name}:{ENCODER_BACKEND}"
+
+
+def get_embedding_cache(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu") -> EmbeddingCache:
+    # One cache instance per model and runtime, so every wrapper writes through the same memory map and index
+    cache_name = _cache_name(model_name)
+    return get_resource(
+        ("embedding_cache", cache_name),
+        lambda: EmbeddingCache(cache_name, get_dense_model(model_name, device).get_sentence_embedding_dimension())
+    )
+
+
+def get_sparse_cache(model_name: str = DEFAULT_MODEL_NAME) -> EmbeddingCache:
+    """On-disk cache of BGE-M3 lexical weights, packed into fixed-size rows."""
+    cache_name = f"{_cache_name(model_name)}:sparse"
+    return get_resource(("embedding_cache", cache_name), lambda: EmbeddingCache(cache_name, 2 * SPARSE_CACHE_TERMS))
+
+
+def get_encoder(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu") -> CachedSentenceTransformer:
+    """Shared, cache-backed dense encoder (PyTorch or ONNX Runtime, see ENCODER_BACKEND)."""
+    return get_resource(
+        ("encoder", model_name, device),
+        lambda: CachedSentenceTransformer(
+            get_dense_model(model_name, device), model_name, cache=get_embedding_cache(model_name, device)
+        )
+    )
+
+
+class SharedBgeEmbeddings(Embeddings):
+    """Same behaviour as HuggingFaceBgeEmbeddings, but encodes with the shared SentenceTransformer."""
+
+    def __init__(self, client, model_name: str, encode_kwargs: dict, query_instruction: str):
+        self.client = client
+        self.model_name = model_name
+        self.encode_kwargs = encode_kwargs
+        self.query_instruction = query_instruction
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [text.replace("\n", " ") for text in texts]
+        return self.client.encode(texts, **self.encode_kwargs).tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        texts = [self.query_instruction + text.replace("\n", " ") for text in texts]
+        return self.client.encode(texts, **self.encode_kwargs).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+
+def get_bge_embeddings(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu",
+                       encode_kwargs: dict = None) -> CachedBgeEmbeddings:
+    """Shared, cache-backed LangChain embeddings for the Document Assistant."""
+    encode_kwargs = dict(encode_kwargs or {})
+
+    def load():
+        from langchain_community.embeddings.huggingface import DEFAULT_QUERY_BGE_INSTRUCTION_EN
+        embeddings = SharedBgeEmbeddings(
+            get_dense_model(model_name, device),
+            model_name,
+            encode_kwargs,
+            DEFAULT_QUERY_BGE_INSTRUCTION_EN,
+        )
+        return CachedBgeEmbeddings(embeddings, cache=get_embedding_cache(model_name, device))
+
+    key = ("bge_embeddings", model_name, device, tuple(sorted(encode_kwargs.items())))
+    return get_resource(key, load)
+
+
+def get_qdrant_client(url: str = DEFAULT_QDRANT_URL, timeout: int = 10, **kwargs):
+    def load():
+        from qdrant_client import QdrantClient
+        return QdrantClient(url=url, timeout=timeout, **kwargs)
+    return get_resource(("qdrant_client", url, timeout, tuple(sorted(kwargs.items()))), load)
+
+
+def get_chat_ollama(model: str = "llama3.2:3b", temperature: float = 0, **kwargs):
+    """Long-lived ChatOllama: its HTTP client (and keep-alive connections) is reused by every caller."""
+    def load():
+        from langchain_ollama import ChatOllama
+        return ChatOllama(model=model, temperature=temperature, **kwargs)
+    return get_resource(("chat_ollama", model, temperature, tuple(sorted(kwargs.items()))), load)
+
+
+def get_chat_openai(model: str = "gpt-3.5-turbo", temperature: float = 0, api_key: str = None, **kwargs):
+    def load():
+        from langchain_community.chat_models import ChatOpenAI
+        return ChatOpenAI(model=model, temperature=temperature, api_key=api_key, **kwargs)
+    # Key on a digest so the API key itself is not part of the registry key
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return get_resource(("chat_openai", model, temperature, key_digest, tuple(sorted(kwargs.items()))), load)
+
+
+def get_query_batcher(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    """Shared micro-batching encoder for concurrent chat queries."""
+    def load():
+        from query_batcher import QueryBatcher
+        encoder = get_encoder(model_name, device)
+        return QueryBatcher(lambda queries: encoder.encode(queries, batch_size=len(queries)).tolist())
+    return get_resource(("query_batcher", model_name, device), load)
+
+
+def get_query_embeddings(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    """Shared query -> embedding LRU in front of the micro-batching encoder."""
+    def load():
+        from query_cache import QueryEmbeddingCache
+        return QueryEmbeddingCache(get_query_batcher(model_name, device).encode)
+    return get_resource(("query_embeddings", model_name, device), load)
+
+
+def get_sparse_encoder(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    """Cache-backed BGE-M3 dense + lexical encoder (one forward pass for both) on the shared dense model.
+
+    With an ONNX backend the lexical weights come from the ONNX token states, so torch is never loaded.
+    """
+    def load():
+        from hybrid import BgeM3SparseEncoder, CachedHybridEncoder
+        return CachedHybridEncoder(
+            BgeM3SparseEncoder(get_dense_model(model_name, device), model_name),
+            get_embedding_cache(model_name, device),
+            get_sparse_cache(model_name),
+        )
+    return get_resource(("sparse_encoder", model_name, device), load)
+
+
+def get_sparse_query_embeddings(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    """Shared query -> sparse vector LRU for hybrid search."""
+    def load():
+        from query_cache import QueryEmbeddingCache
+        # Keyed on the raw text: the XLM-R tokenizer is case-sensitive, so "ELD" and "eld" get different terms
+        return QueryEmbeddingCache(get_sparse_encoder(model_name, device).encode_query, key_fn=str)
+    return get_resource(("sparse_query_embeddings", model_name, device), load)
+
+
+def get_hybrid_query_embeddings(model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    """Shared query -> (dense, sparse) LRU in front of a micro-batcher: one forward pass gives both vectors."""
+    def load():
+        from query_batcher import QueryBatcher
+        from query_cache import QueryEmbeddingCache
+        encoder = get_sparse_encoder(model_name, device)
+
+        def encode_batch(queries):
+            dense, sparse = encoder.encode_hybrid(queries, batch_size=len(queries))
+            return [(vector.tolist(), sparse_vector) for vector, sparse_vector in zip(dense, sparse)]
+        # Raw-text keys, as for the sparse-only LRU
+        return QueryEmbeddingCache(QueryBatcher(encode_batch).encode, key_fn=str)
+    return get_resource(("hybrid_query_embeddings", model_name, device), load)
+
+
+def get_context_builder(max_tokens: int = 1500, model_name: str = DEFAULT_MODEL_NAME, device: str = "cpu"):
+    """Context builder that counts tokens with the already loaded encoder tokenizer."""
+    def load():
+        from context_builder import ContextBuilder, token_counter
+        return ContextBuilder(max_tokens, token_counter(get_dense_model(model_name, device).tokenizer))
+    return get_resource(("context_builder", max_tokens, model_name, device), load)
+
+
+def get_vector_store(collection_name: str, url: str = DEFAULT_QDRANT_URL, backend: str = None):
+    """Search backend for a collection (see vector_store.open_vector_store).
+
+    Keyed on the collection version, so a local export is refreshed after ingestion.
+    """
+    from ingestion import read_collection_versions
+    from vector_store import DEFAULT_BACKEND, open_vector_store
+    backend = backend or DEFAULT_BACKEND
+    version = read_collection_versions().get(collection_name, 0) if backend == "auto" else None
+    return get_resource(
+        ("vector_store", collection_name, url, backend, version),
+        lambda: open_vector_store(lambda: get_qdrant_client(url), collection_name, backend)
+    )
+
+
+def get_response_cache():
+    from query_cache import ResponseCache
+    return get_resource(("response_cache",), ResponseCache)
@@ -1,65 +1,50 @@
-from langchain_text_splitters import RecursiveJsonSplitter
-from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
-from qdrant_client.http import models
-import json
-import uuid
 import os
+import sys
 
-# Initialize encoder and Qdrant client
-encoder = SentenceTransformer("BAAI/bge-m3")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunking import ChunkingEngine, ChunkShaper, load_records, read_sections
+from ingestion import IngestionEngine, IngestionManifest
+from hybrid import is_hybrid_collection
+from collection_setup import ensure_collection
+from resources import lazy_encoder
+
+# Initialize encoder (PyTorch or ONNX Runtime, see ENCODER_BACKEND; loaded on the first encode) and Qdrant client
+encoder = lazy_encoder("BAAI/bge-m3")
 qdrant_client = QdrantClient(host='localhost', port=6333, timeout=10)
 
-# Path to output directories
-output_base_dir = "."
+# Number of chunks sent to the encoder in a single forward pass
+batch_size = 32
+
+# Scraped service pages, and the JSONL artifact of their sections
+source_path = "/home/administrator/Documents/Web_Scraping/data/scraped_data.json"
+sections_path = "scraped_sections.jsonl"
 
 # Collection name
 collection_name = "Rishabh_Collection"
 
-# Create the collection in Qdrant
-qdrant_client.create_collection(
-    collection_name=collection_name,
-    vectors_config=models.VectorParams(
-        size=encoder.get_sentence_embedding_dimension(),
-        distance=models.Distance.COSINE,
-        on_disk=True
-    )
-)
+# Manifest of the points already written, so re-runs only upsert what changed
+manifest = IngestionManifest("ingestion_manifest.json")
+
+# Create the collection in Qdrant if it does not exist yet: named dense + sparse vectors for
+# hybrid search, int8 quantized vectors in RAM and the float32 originals on disk
+if ensure_collection(qdrant_client, collection_name, encoder.get_sentence_embedding_dimension(),
+                     quantization="scalar", on_disk=True):
+    manifest.reset(collection_name)
 
-# Prepare a list to store points for batch upsert
-points = []
+# Points also carry BGE-M3 lexical weights when the collection has a sparse vector
+sparse_encoder = lazy_encoder("BAAI/bge-m3", hybrid=True) if is_hybrid_collection(qdrant_client, collection_name) else None
+engine = IngestionEngine(encoder, batch_size=batch_size, sparse_encoder=sparse_encoder)
 
-# Iterate through all directories that match the pattern 'output_dictionary_*'
-for dir_name in os.listdir(output_base_dir):
-    if dir_name.startswith('output_dictionary_'):
-        dir_path = os.path.join(output_base_dir, dir_name)
-        
-        # Iterate through each JSON file in the directory
-        for file_name in os.listdir(dir_path):
-            if file_name.endswith('.json'):
-                file_path = os.path.join(dir_path, file_name)
-                
-                # Load the content of the JSON file
-                with open(file_path, 'r') as f:
-                    json_data = json.load(f)
-                    
-                    # Assuming the content is wrapped in brackets, so we get the first item
-                    content = json_data[0]  # Unwrapping if necessary
-                    
-                    # Generate a unique point ID
-                    point_id = str(uuid.uuid4())
-                    
-                    # Create the point and encode the content for Qdrant
-                    points.append(
-                        models.PointStruct(
-                            id=point_id,
-                            vector=encoder.encode(str(content)).tolist(),  # Encode the content
-                            payload=content  # Add the content as payload
-                        )
-                    )
+def iter_contents(source_path, sections_path):
+    """Chunk and shape the source pages, or read the sections of an existing artifact when there is no source."""
+    if os.path.exists(source_path):
+        chunker = ChunkingEngine("service_pages", artifact_path=sections_path, shaper=ChunkShaper())
+        return chunker.iter_sections(load_records(source_path))
+    return read_sections(sections_path)
 
-# Upsert the collected points into Qdrant
-if points:
-    qdrant_client.upsert(collection_name=collection_name, points=points)
+# Stream the new or changed sections through the encoder and into Qdrant page by page
+engine.sync(qdrant_client, collection_name, iter_contents(source_path, sections_path), manifest,
+            source="scraped_data", page_size=256, max_in_flight=4)
 
-print(f"All chunks from JSON files in '{output_base_dir}' have been inserted into Qdrant!")
+print("All scraped sections have been inserted into Qdrant!")
@@ -0,0 +1,82 @@
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from resources import get_resource
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DOCUMENT_ASSISTANT_DIR = os.path.join(ROOT_DIR, "Document Asisstant with chatbot")
+
+
+def _run_warmup(loaders: dict):
+    for label, loader in loaders.items():
+        start = time.perf_counter()
+        try:
+            loader()
+        except Exception as e:
+            # Warm-up is best effort: the first real use raises the error where it can be shown
+            print(f"Warm-up of {label} failed: {e}")
+        else:
+            print(f"Warmed up {label} in {time.perf_counter() - start:.2f}s")
+
+
+def start_warmup(loaders: dict, name: str = "default") -> threading.Thread:
+    """Run `loaders` ({label: callable}) once per process on a background thread.
+
+    The loaders go through the resource registry, whose per-key locks make
+    a page that needs a model before warm-up is done wait for that load
+    instead of starting a second one.
+    """
+    def start():
+        thread = threading.Thread(target=_run_warmup, args=(loaders,), name=f"warmup-{name}", daemon=True)
+        thread.start()
+        return thread
+    return get_resource(("warmup", name), start)
+
+
+def import_times(module: str, paths=(ROOT_DIR, DOCUMENT_ASSISTANT_DIR)):
+    """Import `module` in a fresh interpreter and return (total_us, [(cumulative_us, name), ...]) of its direct imports."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(list(paths) + [os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+
+    # -X importtime prints children before their parent, indented two spaces per level
+    children = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        cumulative, name = int(match.group(2)), match.group(4)
+        if depth == 1:
+            children.append((cumulative, name))
+        elif depth == 0:
+            if name == module:
+                return cumulative, children
+            children = []
+    return 0, []
+
+
+def import_report(modules, top: int = 10):
+    """Print the import cost of each module and its heaviest direct imports."""
+    for module in modules:
+        total, children = import_times(module)
+        print(f"{module}: {total / 1e6:.2f}s")
+        for cumulative, name in sorted(children, reverse=True)[:top]:
+            print(f"    {cumulative / 1e6:>6.2f}s  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time report for the apps and scripts.")
+    parser.add_argument("modules", nargs="*", default=["resources", "vectors", "chatbot", "llama_response"],
+                        help="Modules to import (repo root and the Document Assistant are on the path)")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest imports listed per module")
+    args = parser.parse_args()
+    import_report(args.modules, args.top)
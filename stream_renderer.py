@@ -0,0 +1,74 @@
+import time
+from typing import Any
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class BufferedStreamHandler(BaseCallbackHandler):
+    """Stream LLM tokens into a Streamlit container without re-rendering on every token.
+
+    Tokens are appended to a list and the container is only re-rendered
+    when `flush_interval` seconds have passed or `flush_tokens` tokens are
+    pending, plus one final render when the answer is complete. Time to
+    first token and tokens/sec of the last answer are kept in `stats`.
+    """
+
+    def __init__(self, container, initial_text: str = "", flush_interval: float = 0.1, flush_tokens: int = 32):
+        self.container = container
+        self.flush_interval = flush_interval
+        self.flush_tokens = flush_tokens
+        self.stats = {}
+        self.reset(initial_text)
+
+    def reset(self, initial_text: str = ""):
+        self._parts = [initial_text] if initial_text else []
+        self._pending = 0
+        self._token_count = 0
+        self._start_time = time.perf_counter()
+        self._first_token_time = None
+        self._last_flush = self._start_time
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs) -> None:
+        self.reset()
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        now = time.perf_counter()
+        if self._first_token_time is None:
+            self._first_token_time = now
+        self._parts.append(token)
+        self._pending += 1
+        self._token_count += 1
+        if self._pending >= self.flush_tokens or now - self._last_flush >= self.flush_interval:
+            self.flush(now)
+
+    def flush(self, now: float = None):
+        # Collapse the buffer so the next join stays cheap
+        text = "".join(self._parts)
+        self._parts = [text]
+        self.container.markdown(text)
+        self._pending = 0
+        self._last_flush = now or time.perf_counter()
+
+    def on_llm_end(self, response: Any, **kwargs) -> None:
+        end_time = time.perf_counter()
+        if self._pending:
+            self.flush(end_time)
+        if self._first_token_time is not None:
+            generation_time = end_time - self._first_token_time
+            self.stats = {
+                "time_to_first_token": self._first_token_time - self._start_time,
+                "tokens": self._token_count,
+                "tokens_per_second": self._token_count / generation_time if generation_time > 0 else 0.0,
+            }
+
+
+def render_stream(container, tokens, flush_interval: float = 0.1, flush_tokens: int = 32):
+    """Render an iterable of tokens into `container` in place and return (text, stats)."""
+    handler = BufferedStreamHandler(container, flush_interval=flush_interval, flush_tokens=flush_tokens)
+    for token in tokens:
+        handler.on_llm_new_token(token)
+    handler.on_llm_end(None)
+    return handler.text, handler.stats
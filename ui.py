@@ -1,30 +1,26 @@
 import streamlit as st
-from langchain_ollama import ChatOllama
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from langchain.callbacks.base import BaseCallbackHandler
-import json
+from stream_renderer import BufferedStreamHandler
+from resources import (
+    get_chat_ollama, get_query_embeddings, get_hybrid_query_embeddings, get_vector_store,
+    get_response_cache, get_context_builder
+)
+from startup import start_warmup
+from query_router import routed_search
 
-# Initialize Qdrant client
-qdrant_client = QdrantClient(host='localhost', port=6333, timeout=10)
+collection_name = "Rishabh_Collection"
+llm_model = "llama3.2:3b"
+llm_temperature = 0
 
-# Initialize the encoder
-encoder = SentenceTransformer("BAAI/bge-m3")
-
-class StreamHandler(BaseCallbackHandler):
+class StreamHandler(BufferedStreamHandler):
+    # Tokens are buffered and rendered every 100 ms / 32 tokens instead of on every token
     def __init__(self, container, initial_text=""):
-        self.container = container
-        self.text = initial_text
-
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        self.text += token
-        self.container.markdown(self.text)
+        super().__init__(container, initial_text=initial_text, flush_interval=0.1, flush_tokens=32)
 
 def initialize_llm(llm_model="llama3.2:3b", llm_temperature=0.5):
-    return ChatOllama(
+    return get_chat_ollama(
         model=llm_model,
         temperature=llm_temperature,
         streaming=True
@@ -50,14 +46,30 @@ Please provide your helpful answer below:
     )
     return LLMChain(llm=llm, prompt=prompt)
 
+# Answer cache, shared across reruns and sessions
+response_cache = get_response_cache()
+
+# BGE-M3 (behind the query embeddings and the context builder's tokenizer) loads in the
+# background while the page renders; the first question waits for it if it is not done yet
+start_warmup({
+    "query embeddings": lambda: get_query_embeddings("BAAI/bge-m3"),
+    "context builder": lambda: get_context_builder(max_tokens=1500),
+}, name="ui")
+
 def get_similar_chunks(query: str, top_k: int = 5):
-    query_vector = encoder.encode(query).tolist()
-    search_result = qdrant_client.search(
-        collection_name="Rishabh_Collection",
-        query_vector=query_vector,
-        limit=top_k
-    )
-    return [json.dumps(hit.payload, indent=2) for hit in search_result]
+    # Qdrant or the in-process index, depending on VECTOR_BACKEND
+    vector_store = get_vector_store(collection_name)
+    # Query embeddings: LRU + micro-batching encoder. Hybrid collections also match exact terms
+    # through BGE-M3's lexical weights, computed in the same forward pass as the dense vector
+    if vector_store.hybrid:
+        query_vector, sparse_vector = get_hybrid_query_embeddings("BAAI/bge-m3").encode(query)
+    else:
+        query_vector, sparse_vector = get_query_embeddings("BAAI/bge-m3").encode(query), None
+    # Questions about contact details or (industry-specific) case studies only search those sections
+    search_result = routed_search(query, lambda conditions: vector_store.search(
+        query_vector, sparse_vector, limit=top_k, conditions=conditions
+    ))
+    return [hit.payload for hit in search_result]
 
 # Streamlit app
 st.title("Rishabh Website Chatbot with llama3.2:3b")
@@ -65,7 +77,7 @@ st.title("Rishabh Website Chatbot with llama3.2:3b")
 # Initialize the LLM and chain
 @st.cache_resource
 def load_llm_chain():
-    llm = initialize_llm(llm_model="llama3.2:3b", llm_temperature=0)
+    llm = initialize_llm(llm_model=llm_model, llm_temperature=llm_temperature)
     return initialize_chain(llm)
 
 chain = load_llm_chain()
@@ -77,12 +89,27 @@ if user_question:
     # Create a placeholder for the streaming response
     response_placeholder = st.empty()
     stream_handler = StreamHandler(response_placeholder)
-    
-    similar_chunks = get_similar_chunks(user_question)
-    context = "\n\n".join(similar_chunks)
-    
-    # Generate the response with streaming
-    chain({"context": context, "question": user_question}, callbacks=[stream_handler])
+
+    # Repeated questions at temperature 0 are answered straight from the cache
+    cache_key = response_cache.key(user_question, collection_name, chain.prompt.template, llm_model, llm_temperature)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        answer, context = cached
+        response_placeholder.markdown(answer)
+    else:
+        similar_chunks = get_similar_chunks(user_question)
+        # Compact, token-budgeted context instead of pretty-printed JSON payloads
+        context = get_context_builder(max_tokens=1500).build(similar_chunks)
+
+        # Generate the response with streaming
+        result = chain({"context": context, "question": user_question}, callbacks=[stream_handler])
+        response_cache.put(cache_key, (result["text"], context))
+
+        if stream_handler.stats:
+            st.caption(
+                f"First token after {stream_handler.stats['time_to_first_token']:.2f}s · "
+                f"{stream_handler.stats['tokens_per_second']:.1f} tokens/s"
+            )
 
     if st.checkbox("Show Context"):
         st.text_area("Context:", value=context, height=300)
\ No newline at end of file
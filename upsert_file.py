@@ -1,46 +1,44 @@
-from langchain_text_splitters import RecursiveJsonSplitter
-from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
-from qdrant_client.http import models
 import json
-import uuid
-
-encoder = SentenceTransformer("BAAI/bge-m3")
+from chunking import category_for_path, tag_sections
+from ingestion import IngestionEngine, IngestionManifest
+from hybrid import is_hybrid_collection
+from collection_setup import ensure_collection
+from resources import lazy_encoder
+
+# Dense encoder (PyTorch or ONNX Runtime, see ENCODER_BACKEND), loaded only once there is something to encode
+encoder = lazy_encoder("BAAI/bge-m3")
 qdrant_client = QdrantClient(host='localhost', port=6333,timeout=10)
 
+# Number of chunks sent to the encoder in a single forward pass
+batch_size = 32
+engine = IngestionEngine(encoder, batch_size=batch_size)
+
 
-with open('/home/administrator/Documents/Rishabh_Bot/Rishabh_data/services_provided.json', 'r') as f:
+source_path = '/home/administrator/Documents/Rishabh_Bot/Rishabh_data/services_provided.json'
+with open(source_path, 'r') as f:
     json_data = json.load(f)
 
+# Tag the chunks with the category of their file (contact, location, ...) for filtered search
+json_data = tag_sections(json_data, category=category_for_path(source_path))
+
 
 collection_name = "Rishabh_Collection"
 
-# qdrant_client.create_collection(
-#     collection_name=collection_name,
-#     vectors_config=models.VectorParams(
-#             size=encoder.get_sentence_embedding_dimension(),
-#             distance=models.Distance.COSINE, on_disk= True
-#         ),
-#     # hnsw_config=models.HnswConfigDiff(
-#     #                     m=16,
-#     #                     ef_construct=100,
-#     #                     full_scan_threshold=2000
-#     #                 )
-# )
-
-
-points=[]
-for chunk in json_data:
-        point_id = str(uuid.uuid4())
-        points.append(
-            models.PointStruct(
-                id=point_id,
-                vector=encoder.encode(str(chunk)).tolist(),  # Assuming encoder is defined and encode method works
-                payload=chunk
-            )
-        )
-    
-qdrant_client.upsert(collection_name="Rishabh_Collection", points=points)
+# Manifest of the points already written, so re-runs only upsert what changed
+manifest = IngestionManifest("ingestion_manifest.json")
+
+# Quantized hybrid collection with the shared HNSW settings, created only if missing
+if ensure_collection(qdrant_client, collection_name, encoder.get_sentence_embedding_dimension()):
+    manifest.reset(collection_name)
+
+
+# Hybrid collections also get BGE-M3 lexical weights for every chunk
+if is_hybrid_collection(qdrant_client, collection_name):
+    engine.sparse_encoder = lazy_encoder("BAAI/bge-m3", hybrid=True)
+
+# Only new or changed chunks are encoded and upserted; chunks removed from the file are deleted
+engine.sync(qdrant_client, collection_name, json_data, manifest, source=source_path, page_size=256, max_in_flight=4)
 
 print("All chunks inserted into Qdrant!")
 
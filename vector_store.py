@@ -0,0 +1,269 @@
+import os
+import json
+import argparse
+import mmap
+import shutil
+from itertools import chain
+import numpy as np
+from qdrant_client.http import models
+from ingestion import read_collection_versions
+from query_router import payload_matches
+from hybrid import DENSE_VECTOR_NAME, is_hybrid_collection, query_request, search_points
+
+# Exported collections for the in-process backend, one directory per collection
+DEFAULT_INDEX_DIR = os.getenv(
+    "VECTOR_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_index")
+)
+
+# "qdrant", "local" or "auto" (local while the collection is small enough, Qdrant beyond that)
+DEFAULT_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+MAX_LOCAL_POINTS = int(os.getenv("VECTOR_MAX_LOCAL_POINTS", "50000"))
+
+
+class LocalVectorIndex:
+    """Exact cosine search over a memory-mapped matrix of L2-normalized vectors.
+
+    Layout of an index directory: `vectors.bin` (count x dimension, float32
+    or float16), `payloads.jsonl` with `offsets.npy` so only the payloads of
+    the hits are parsed, and `meta.json` with the point IDs and the
+    collection version it was exported at.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.count = len(self.ids)
+        self.dimension = meta["dimension"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.version = meta.get("version")
+
+        if self.count:
+            self.vectors = np.memmap(
+                os.path.join(path, "vectors.bin"), dtype=self.dtype, mode="r", shape=(self.count, self.dimension)
+            )
+            self.offsets = np.load(os.path.join(path, "offsets.npy"))
+            with open(os.path.join(path, "payloads.jsonl"), "rb") as f:
+                self.payloads = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.vectors = np.empty((0, self.dimension), dtype=self.dtype)
+        # Row masks of the payload conditions searched so far
+        self.masks = {}
+
+    @staticmethod
+    def write(path: str, points, dimension: int, dtype: str = "float32", version=None):
+        """Write (id, vector, payload) triples to a new index at `path`, replacing any previous one."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        ids, offsets = [], []
+        with open(os.path.join(tmp_path, "vectors.bin"), "wb") as vectors_file, \
+                open(os.path.join(tmp_path, "payloads.jsonl"), "wb") as payloads_file:
+            for point_id, vector, payload in points:
+                vector = np.asarray(vector, dtype=np.float32)
+                vector /= max(np.linalg.norm(vector), 1e-12)
+                vectors_file.write(vector.astype(dtype).tobytes())
+                offsets.append(payloads_file.tell())
+                payloads_file.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+                ids.append(point_id)
+            offsets.append(payloads_file.tell())
+
+        np.save(os.path.join(tmp_path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({"ids": ids, "dimension": dimension, "dtype": dtype, "version": version}, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return LocalVectorIndex(path)
+
+    def payload(self, row: int) -> dict:
+        return json.loads(self.payloads[self.offsets[row]:self.offsets[row + 1]])
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine scores of every stored vector against every query, shape (count, queries)."""
+        if self.dtype == np.float32:
+            return self.vectors @ queries.T
+        # float16 has no BLAS kernel: upcast one block at a time instead of the whole matrix
+        scores = np.empty((self.count, len(queries)), dtype=np.float32)
+        for start in range(0, self.count, 8192):
+            scores[start:start + 8192] = self.vectors[start:start + 8192].astype(np.float32) @ queries.T
+        return scores
+
+    def mask(self, conditions: dict) -> np.ndarray:
+        """Rows whose payload satisfies `conditions`; every payload is read once per distinct filter."""
+        key = tuple(sorted((field, tuple(values)) for field, values in conditions.items()))
+        if key not in self.masks:
+            self.masks[key] = np.fromiter(
+                (payload_matches(self.payload(row), conditions) for row in range(self.count)),
+                dtype=bool, count=self.count
+            )
+        return self.masks[key]
+
+    def search_batch(self, query_vectors, limit: int = 5, conditions=None):
+        """Top `limit` hits of every query, as ScoredPoints like Qdrant returns them.
+
+        `conditions` holds one {field: [allowed values]} dict (or None) per query.
+        """
+        # Checked before the reshape: an empty export may not know the vector size
+        if min(limit, self.count) == 0:
+            return [[] for _ in query_vectors]
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dimension)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        conditions = conditions or [None] * len(queries)
+
+        scores = self.scores(queries)
+        results = []
+        for column, query_conditions in zip(scores.T, conditions):
+            k = min(limit, self.count)
+            if query_conditions:
+                mask = self.mask(query_conditions)
+                column = np.where(mask, column, -np.inf)
+                k = min(k, int(mask.sum()))
+            if k == 0:
+                results.append([])
+                continue
+            # Partial sort: only the k best rows are ordered
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            results.append([
+                models.ScoredPoint(id=self.ids[row], version=0, score=float(column[row]), payload=self.payload(row))
+                for row in top
+            ])
+        return results
+
+    def search(self, query_vector, limit: int = 5, conditions: dict = None):
+        return self.search_batch([query_vector], limit, [conditions])[0]
+
+
+def export_collection(client, collection_name: str, path: str, dtype: str = "float32", page_size: int = 256,
+                      version=None) -> LocalVectorIndex:
+    """Copy the dense vectors and payloads of a Qdrant collection into a LocalVectorIndex."""
+    using = DENSE_VECTOR_NAME if is_hybrid_collection(client, collection_name) else None
+    dimension = None
+
+    def iter_points():
+        nonlocal dimension
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name, limit=page_size, offset=offset, with_payload=True,
+                with_vectors=[using] if using else True
+            )
+            for point in points:
+                vector = point.vector[using] if using else point.vector
+                dimension = len(vector)
+                yield point.id, vector, point.payload
+            if offset is None:
+                return
+
+    # The dimension is only known once the first point is read
+    points = iter_points()
+    first = next(points, None)
+    if first is None:
+        # Nothing to read it from: take the vector size from the collection config
+        vectors = client.get_collection(collection_name).config.params.vectors
+        dimension = (vectors[using] if using else vectors).size
+        return LocalVectorIndex.write(path, [], dimension, dtype, version)
+    return LocalVectorIndex.write(path, chain([first], points), dimension, dtype, version)
+
+
+class QdrantBackend:
+    """Search through the Qdrant server (hybrid queries on hybrid collections)."""
+
+    def __init__(self, client, collection_name: str):
+        self.client = client
+        self.collection_name = collection_name
+
+    @property
+    def hybrid(self) -> bool:
+        return is_hybrid_collection(self.client, self.collection_name)
+
+    def search(self, dense_vector, sparse_vector=None, limit: int = 5, conditions: dict = None):
+        return search_points(
+            self.client, self.collection_name, dense_vector, sparse_vector, limit=limit, conditions=conditions
+        )
+
+    def search_batch(self, dense_vectors, sparse_vectors=None, limit: int = 5, conditions=None):
+        hybrid = self.hybrid
+        sparse_vectors = sparse_vectors or [None] * len(dense_vectors)
+        conditions = conditions or [None] * len(dense_vectors)
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                query_request(dense_vector, sparse_vector, hybrid, limit, conditions=query_conditions)
+                for dense_vector, sparse_vector, query_conditions in zip(dense_vectors, sparse_vectors, conditions)
+            ]
+        )
+        return [response.points for response in responses]
+
+
+class LocalBackend:
+    """In-process exact dense search over an exported collection; sparse vectors are ignored."""
+
+    hybrid = False
+
+    def __init__(self, index: LocalVectorIndex):
+        self.index = index
+
+    def search(self, dense_vector, sparse_vector=None, limit: int = 5, conditions: dict = None):
+        return self.index.search(dense_vector, limit, conditions)
+
+    def search_batch(self, dense_vectors, sparse_vectors=None, limit: int = 5, conditions=None):
+        return self.index.search_batch(dense_vectors, limit, conditions)
+
+
+def open_vector_store(client_factory, collection_name: str, backend: str = DEFAULT_BACKEND,
+                      index_dir: str = DEFAULT_INDEX_DIR, dtype: str = "float32",
+                      max_local_points: int = MAX_LOCAL_POINTS):
+    """Return the search backend for a collection.
+
+    "qdrant" always queries the server and "local" reads the export,
+    creating it from the collection if there is none yet (re-export with
+    `python vector_store.py <collection>` after ingesting). "auto" keeps a local export in line with the collection version
+    while the collection has at most `max_local_points` points, and falls
+    back to Qdrant once it grows past that.
+    """
+    path = os.path.join(index_dir, collection_name)
+    if backend == "qdrant":
+        return QdrantBackend(client_factory(), collection_name)
+    if backend == "local":
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            print(f"Exporting '{collection_name}' to {path}")
+            version = read_collection_versions().get(collection_name, 0)
+            return LocalBackend(export_collection(client_factory(), collection_name, path, dtype, version=version))
+        return LocalBackend(LocalVectorIndex(path))
+    if backend != "auto":
+        raise ValueError(f"Unsupported vector backend: {backend}")
+
+    client = client_factory()
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count > max_local_points:
+        return QdrantBackend(client, collection_name)
+
+    version = read_collection_versions().get(collection_name, 0)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        index = LocalVectorIndex(path)
+        if index.version == version and index.count == count and index.dtype == np.dtype(dtype):
+            return LocalBackend(index)
+    print(f"Exporting {count} points of '{collection_name}' to {path}")
+    return LocalBackend(export_collection(client, collection_name, path, dtype, version=version))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a Qdrant collection for VECTOR_BACKEND=local.")
+    parser.add_argument("collection", help="Collection to export")
+    parser.add_argument("--url", default="http://localhost:6333", help="Qdrant URL")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="Directory of the exported collections")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"], help="Stored vector type")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    path = os.path.join(args.index_dir, args.collection)
+    index = export_collection(
+        QdrantClient(url=args.url, timeout=60), args.collection, path, args.dtype,
+        version=read_collection_versions().get(args.collection, 0)
+    )
+    print(f"Exported {index.count} points of '{args.collection}' to {path}")